@@ -0,0 +1,154 @@
+import threading
+import logging
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+from data import fetch_latest_rows, fetch_rows_after
+
+# 設置日誌記錄
+logger = logging.getLogger(__name__)
+
+ALARM_AXES = ['XOUT', 'YOUT', 'ZOUT']
+ALARM_DEBOUNCE_SAMPLES = 3     # 連續超限的樣本數達到此值才觸發，濾除單點雜訊
+ALARM_CLEAR_SAMPLES = 100      # 連續低於解除門檻的樣本數達到此值才解除 (100 Hz 約 1 秒)，振動穿越門檻時不反覆觸發/解除
+ALARM_RATE_WINDOW = 50         # 變化率的平均視窗樣本數 (100 Hz 約 0.5 秒)
+ALARM_RMS_WINDOW = 50          # 振動 RMS 的滑動視窗樣本數
+ALARM_EVENT_HISTORY = 200      # 記憶體中保留的最近事件數
+ALARM_MAX_BATCH_ROWS = 50000   # 每次評估最多讀取的新資料列數
+
+# 警報規則：名稱、觸發門檻、解除門檻 (低於觸發門檻形成遲滯)、顯示訊息。
+# RATE 為平滑後的每秒變化率，量測的是趨勢 (例如溫漂、鬆脫造成的偏移)，不是振動本身的瞬時斜率
+ALARM_RULES = [
+    ('RANGE', 9.0, 8.5, "{axis} 超過範圍！"),
+    ('RATE', 5.0, 4.0, "{axis} 變化率過高！"),
+    ('RMS', 3.0, 2.5, "{axis} 振動 RMS 過高！"),
+]
+
+# 連續 True 的長度；carry 為上一批結尾時的連續長度
+def _run_lengths(mask, carry):
+    index = np.arange(len(mask))
+    last_false = np.maximum.accumulate(np.where(mask, -1, index))
+    runs = index - last_false + np.where(last_false < 0, carry, 0)
+    return np.where(mask, runs, 0)
+
+# 遲滯狀態機的向量化版本：觸發/解除事件標記後向前填補，未標記的樣本維持前一個狀態。
+# 觸發與解除各自去抖動：連續 raise_samples 個樣本超過觸發門檻才觸發，連續 clear_samples 個樣本低於解除門檻才解除
+def _hysteresis(metric, high, low, state, raise_samples=ALARM_DEBOUNCE_SAMPLES, clear_samples=ALARM_CLEAR_SAMPLES):
+    runs = _run_lengths(metric > high, state['run'])
+    clear_runs = _run_lengths(metric < low, state['clear_run'])
+    marks = np.where(runs >= raise_samples, 1, np.where(clear_runs >= clear_samples, 0, -1))
+
+    index = np.arange(len(metric))
+    last_mark = np.maximum.accumulate(np.where(marks >= 0, index, -1))
+    active = np.where(last_mark >= 0, marks[np.maximum(last_mark, 0)], int(state['active'])).astype(bool)
+
+    previous = np.concatenate(([state['active']], active[:-1]))
+    state['run'], state['clear_run'] = int(runs[-1]), int(clear_runs[-1])
+    state['active'] = bool(active[-1])
+    return np.flatnonzero(active != previous), active
+
+# 以 NumPy 對每一批新資料一次評估所有規則，規則狀態在批次之間延續
+class AlarmEngine:
+    def __init__(self, axes=ALARM_AXES, rules=ALARM_RULES, device=None):
+        self.device = device
+        self.axes = axes
+        self.rules = rules
+        self.watermark = None
+        self.warmup = max(ALARM_RMS_WINDOW, 2 * ALARM_RATE_WINDOW)  # 首次評估時讀取的最近資料列數
+        self.raise_samples = ALARM_DEBOUNCE_SAMPLES
+        self.clear_samples = ALARM_CLEAR_SAMPLES
+        self.events = deque(maxlen=ALARM_EVENT_HISTORY)
+        self._states = {(axis, rule[0]): {'run': 0, 'clear_run': 0, 'active': False} for axis in axes for rule in rules}
+        self._carry = {axis: {'seconds': np.empty(0), 'tail': np.empty(0)} for axis in axes}
+        self._lock = threading.Lock()
+
+    # 計算各規則的指標：絕對值、平滑後的每秒變化率、視窗內去除平均後的 RMS。
+    # 變化率為最近 ALARM_RATE_WINDOW 個樣本與再之前同樣長度的平均值之差，除以兩段的平均時間差；
+    # 振動在視窗內互相抵消，只留下趨勢，視窗未滿時為 0
+    def _metrics(self, axis, times, values):
+        carry = self._carry[axis]
+        seconds = times.astype('datetime64[ns]').astype(np.int64) / 1e9
+        extended = np.concatenate((carry['tail'], values))
+        elapsed = np.concatenate((carry['seconds'], seconds))
+        elapsed -= elapsed[0]  # 時間先減去起點，避免累積和損失精度
+        sums = np.concatenate(([0.0], np.cumsum(extended)))
+        squares = np.concatenate(([0.0], np.cumsum(extended ** 2)))
+        time_sums = np.concatenate(([0.0], np.cumsum(elapsed)))
+        end = np.arange(len(carry['tail']) + 1, len(extended) + 1)
+
+        middle = np.maximum(end - ALARM_RATE_WINDOW, 0)
+        first = np.maximum(end - 2 * ALARM_RATE_WINDOW, 0)
+        value_change = (sums[end] - 2 * sums[middle] + sums[first]) / ALARM_RATE_WINDOW
+        time_change = (time_sums[end] - 2 * time_sums[middle] + time_sums[first]) / ALARM_RATE_WINDOW
+        full = (end >= 2 * ALARM_RATE_WINDOW) & (time_change > 0)
+        rate = np.where(full, np.abs(value_change) / np.where(full, time_change, 1.0), 0.0)
+
+        start = np.maximum(end - ALARM_RMS_WINDOW, 0)
+        count = end - start
+        mean = (sums[end] - sums[start]) / count
+        variance = np.maximum((squares[end] - squares[start]) / count - mean ** 2, 0.0)
+
+        keep = max(ALARM_RMS_WINDOW, 2 * ALARM_RATE_WINDOW) - 1
+        carry['seconds'], carry['tail'] = np.concatenate((carry['seconds'], seconds))[-keep:], extended[-keep:]
+        return {'RANGE': np.abs(values), 'RATE': rate, 'RMS': np.sqrt(variance)}
+
+    def process(self, df):
+        with self._lock:
+            if self.watermark is not None:
+                df = df[df['RECORDED_TIME'] > self.watermark]
+            if df.empty:
+                return []
+
+            times = df['RECORDED_TIME'].to_numpy()
+            new_events = []
+            for axis in self.axes:
+                values = df[axis].to_numpy(dtype=np.float64)
+                metrics = self._metrics(axis, times, values)
+                for name, high, low, _ in self.rules:
+                    changed, active = _hysteresis(metrics[name], high, low, self._states[(axis, name)],
+                                                  self.raise_samples, self.clear_samples)
+                    for i in changed:
+                        new_events.append({
+                            'RECORDED_TIME': pd.Timestamp(times[i]),
+                            'AXIS': axis,
+                            'RULE': name,
+                            'STATE': 'RAISED' if active[i] else 'CLEARED',
+                            'VALUE': float(metrics[name][i]),
+                            'DEVICE_ID': self.device,
+                        })
+
+            new_events.sort(key=lambda event: event['RECORDED_TIME'])
+            self.events.extend(new_events)
+            self.watermark = df['RECORDED_TIME'].iloc[-1]
+            return new_events
+
+    def active_messages(self):
+        with self._lock:
+            return [message.format(axis=axis)
+                    for axis in self.axes
+                    for name, _, _, message in self.rules
+                    if self._states[(axis, name)]['active']]
+
+    def recent_events(self, limit=5):
+        with self._lock:
+            return list(self.events)[-limit:]
+
+# 每台設備一個引擎，規則狀態與浮水印各自獨立；None 為不分設備的單一資料來源
+_engines = {}
+_engines_lock = threading.Lock()
+
+def get_alarm_engine(device=None):
+    with _engines_lock:
+        engine = _engines.get(device)
+        if engine is None:
+            engine = _engines[device] = AlarmEngine(device=device)
+        return engine
+
+# 共用同一資料表的多個引擎只查詢一次：從最舊的浮水印之後讀取，各引擎再依自己的浮水印過濾
+def fetch_new_rows(engines, table_name='AccelerometerData', device=None):
+    watermarks = [engine.watermark for engine in engines]
+    if any(watermark is None for watermark in watermarks):
+        return fetch_latest_rows(table_name, limit=max(engine.warmup for engine in engines), device=device)
+    return fetch_rows_after(table_name, min(watermarks), limit=ALARM_MAX_BATCH_ROWS, device=device)
@@ -0,0 +1,133 @@
+import threading
+import logging
+
+import numpy as np
+from scipy.signal import lfilter
+
+from alarms import AlarmEngine
+
+# 設置日誌記錄
+logger = logging.getLogger(__name__)
+
+# 異常偵測：固定門檻之外，以資料本身的分布偵測振動型態的改變 (例如軸承磨損造成的 STD 上升、峰值頻率漂移)。
+# z 分數規則與近期的滾動視窗比較，抓突發的偏離；EWMA 與 CUSUM 與長期基準比較，抓緩慢的漂移
+# (滾動視窗會跟著漂移移動，緩慢的變化永遠不會偏離它)。偵測器都是 NumPy 遞迴式，狀態在批次之間延續，每次只處理新資料
+
+# 偵測的資料表：欄位與滾動視窗的樣本數 (原始資料 100 Hz 約 5 秒；StatisticsData 每列 10 秒，約 10 分鐘)
+ANOMALY_SOURCES = {
+    'AccelerometerData': (['XOUT', 'YOUT', 'ZOUT'], 500),
+    'StatisticsData': (['STD_X', 'STD_Y', 'STD_Z', 'PEAK_FREQ_X', 'PEAK_FREQ_Y', 'PEAK_FREQ_Z'], 60),
+}
+# 長期基準的樣本數 (指數加權的時間常數)：原始資料約 1 小時；StatisticsData 約 3 天，一天內的緩慢變化仍會明顯偏離基準
+ANOMALY_REFERENCE_SAMPLES = {'AccelerometerData': 360000, 'StatisticsData': 25920}
+# 觸發與解除的去抖動樣本數：原始資料沿用警報的設定，單點雜訊不觸發；StatisticsData 每列已是 10 秒的統計量，單列偏離即觸發
+ANOMALY_DEBOUNCE = {'AccelerometerData': (3, 100), 'StatisticsData': (1, 3)}
+ANOMALY_MIN_RELATIVE_STD = 0.01   # 標準差下限 (相對於平均值)，近乎常數的欄位 (峰值頻率) 不因微小跳動而觸發
+ANOMALY_Z_CLIP = 3.0              # EWMA 與 CUSUM 的輸入上限：衝擊由 z 分數規則處理，不累積成漂移
+ANOMALY_EWMA_ALPHA = 0.1
+ANOMALY_CUSUM_DRIFT = 0.5         # CUSUM 的容許偏移 k (以標準差為單位)
+
+# 規則格式與警報規則相同：名稱、觸發門檻、解除門檻、顯示訊息。門檻依取樣率而定：
+# 原始資料每秒 100 筆，門檻提高到白雜訊下數小時才誤報一次；StatisticsData 每 10 秒一筆，門檻設在平穩資料數天的最大值之上
+ANOMALY_RULES = {
+    'AccelerometerData': [
+        ('ZSCORE', 5.0, 4.0, "{axis} 偏離近期分布！"),
+        ('EWMA', 5.0, 3.0, "{axis} 平均值漂移！"),
+        ('CUSUM', 16.0, 8.0, "{axis} 持續偏移！"),
+    ],
+    'StatisticsData': [
+        ('ZSCORE', 6.0, 4.0, "{axis} 偏離近期分布！"),
+        ('EWMA', 5.5, 3.0, "{axis} 平均值漂移！"),
+        ('CUSUM', 12.0, 6.0, "{axis} 持續偏移！"),
+    ],
+}
+ANOMALY_RULE_NAMES = ['ZSCORE', 'EWMA', 'CUSUM']
+
+# 滾動 z 分數：與前 window 個樣本 (不含目前樣本) 的平均值與標準差比較，視窗未滿時為 0。
+# 累積和先減去第一個值，避免大數相減損失精度
+def _rolling_zscore(values, carry, window):
+    extended = np.concatenate((carry['tail'], values))
+    shifted = extended - extended[0]
+    sums = np.concatenate(([0.0], np.cumsum(shifted)))
+    squares = np.concatenate(([0.0], np.cumsum(shifted ** 2)))
+    end = np.arange(len(carry['tail']), len(extended))
+    start = np.maximum(end - window, 0)
+    count = np.maximum(end - start, 1)
+    mean = (sums[end] - sums[start]) / count
+    variance = np.maximum((squares[end] - squares[start]) / count - mean ** 2, 0.0)
+    mean += extended[0]
+    std = np.maximum(np.sqrt(variance), np.maximum(ANOMALY_MIN_RELATIVE_STD * np.abs(mean), 1e-9))
+
+    carry['tail'] = extended[-window:]
+    return np.where(end - start >= window, (values - mean) / std, 0.0)
+
+# 長期基準：指數加權的平均值與變異數 (α = 1/samples)，z 分數以前一個樣本為止的基準計算，目前樣本不影響自己的基準。
+# 兩者都是一階遞迴，以 lfilter 延續上一批的狀態；起始狀態為 0，除以 1-(1-α)^n 修正起始偏差
+def _reference_zscore(values, carry, samples, warmup):
+    alpha = 1.0 / samples
+    count = carry['ref_count'] + np.arange(len(values))
+    weight = np.maximum(1.0 - (1.0 - alpha) ** count, 1e-12)  # 每個樣本之前已累積的權重
+    # lfilter 的狀態為 (1-α)y[n-1]，由它還原上一批最後的基準
+    previous_mean = carry['ref_mean'] / (1.0 - alpha)
+    raw_mean, carry['ref_mean'] = lfilter([alpha], [1.0, alpha - 1.0], values, zi=carry['ref_mean'])
+    mean = np.concatenate((previous_mean, raw_mean[:-1])) / weight
+    deviation = np.where(count > 0, values - mean, 0.0)
+
+    previous_variance = carry['ref_var'] / (1.0 - alpha)
+    raw_variance, carry['ref_var'] = lfilter([alpha * (1.0 - alpha)], [1.0, alpha - 1.0], deviation ** 2,
+                                             zi=carry['ref_var'])
+    variance = np.concatenate((previous_variance, raw_variance[:-1])) / weight
+    std = np.maximum(np.sqrt(variance), np.maximum(ANOMALY_MIN_RELATIVE_STD * np.abs(mean), 1e-9))
+
+    carry['ref_count'] = count[-1] + 1
+    return np.where(count >= warmup, deviation / std, 0.0)
+
+# EWMA：y[n] = αz[n] + (1-α)y[n-1]，以 lfilter 的初始狀態延續上一批；輸出除以穩態標準差 sqrt(α/(2-α))
+def _ewma(z, carry, alpha=ANOMALY_EWMA_ALPHA):
+    smoothed, carry['ewma'] = lfilter([alpha], [1.0, alpha - 1.0], z, zi=carry['ewma'])
+    return np.abs(smoothed) / np.sqrt(alpha / (2.0 - alpha))
+
+# Lindley 遞迴 S[n] = max(0, S[n-1] + d[n]) 的向量化解：S = C - min(0, C 的累積最小值)，C 為含起始值的累積和
+def _lindley(steps, start):
+    totals = start + np.cumsum(steps)
+    return totals - np.minimum(np.minimum.accumulate(totals), 0.0)
+
+# 雙邊 CUSUM：分別累積向上與向下的偏移，取較大者
+def _cusum(z, carry, drift=ANOMALY_CUSUM_DRIFT):
+    high = _lindley(z - drift, carry['cusum_high'])
+    low = _lindley(-z - drift, carry['cusum_low'])
+    carry['cusum_high'], carry['cusum_low'] = high[-1], low[-1]
+    return np.maximum(high, low)
+
+# 沿用警報引擎的批次評估、遲滯與事件紀錄，只替換各規則的指標；事件的 AXIS 為欄位名稱
+class AnomalyEngine(AlarmEngine):
+    def __init__(self, table_name='AccelerometerData', device=None):
+        columns, window = ANOMALY_SOURCES[table_name]
+        super().__init__(axes=columns, rules=ANOMALY_RULES[table_name], device=device)
+        self.table_name = table_name
+        self.window = window
+        self.warmup = window
+        self.reference_samples = ANOMALY_REFERENCE_SAMPLES[table_name]
+        self.raise_samples, self.clear_samples = ANOMALY_DEBOUNCE[table_name]
+        self._carry = {column: {'tail': np.empty(0), 'ewma': np.zeros(1), 'cusum_high': 0.0, 'cusum_low': 0.0,
+                                'ref_mean': np.zeros(1), 'ref_var': np.zeros(1), 'ref_count': 0}
+                       for column in columns}
+
+    def _metrics(self, axis, times, values):
+        carry = self._carry[axis]
+        z = _rolling_zscore(values, carry, self.window)
+        # 基準至少累積一個滾動視窗的樣本才開始比較
+        reference = _reference_zscore(values, carry, self.reference_samples, self.window)
+        drift = np.clip(reference, -ANOMALY_Z_CLIP, ANOMALY_Z_CLIP)
+        return {'ZSCORE': np.abs(z), 'EWMA': _ewma(drift, carry), 'CUSUM': _cusum(drift, carry)}
+
+# 每個 (資料表, 設備) 一個引擎
+_engines = {}
+_engines_lock = threading.Lock()
+
+def get_anomaly_engine(table_name='AccelerometerData', device=None):
+    with _engines_lock:
+        engine = _engines.get((table_name, device))
+        if engine is None:
+            engine = _engines[(table_name, device)] = AnomalyEngine(table_name, device)
+        return engine
@@ -1,17 +1,30 @@
 import dash
 import dash_bootstrap_components as dbc
 import plotly.graph_objs as go
-from dash.dependencies import Input, Output, State
+from dash.dependencies import Input, Output, State, ClientsideFunction
 from dash.exceptions import PreventUpdate
 import pandas as pd
-from data import fetch_filtered_data, clear_cache
-from plots import plot_time_series, plot_frequency_spectrum, plot_3d_surface, create_combined_plot
+from data import cache_stats, coalesce, fetch_alarm_events, fetch_filtered_data, fetch_latest_rows, fetch_week_starts, fetch_weeks, ensure_time_indexes, get_snapshot, iter_range_chunks
+from data import detect_device_columns, fetch_devices, fetch_fleet_summary, DEVICE_COLUMN, ROLLUP_AXES
+from export import EXPORT_FORMATS, iter_csv, iter_parquet, iter_gzip, parquet_available
+from live import get_live_feed
+from alarms import get_alarm_engine, fetch_new_rows
+from anomaly import get_anomaly_engine, ANOMALY_RULE_NAMES
+from plots import plot_time_series, plot_frequency_spectrum, plot_3d_surface, plot_week_comparison, plot_fleet_overview, DEFAULT_MAX_POINTS, SURFACE_MAX_POINTS
 from layout import create_layout
+from worker import start_background_worker
+from shared import FileLock, lock_path
+import metrics
 from dash import dcc, html
+from cachetools import LRUCache
 import urllib.parse
-import base64
+import threading
+import queue
 import flask
+import gzip
 import logging
+import os
+import time
 
 # 設置日誌記錄
 logging.basicConfig(level=logging.INFO)
@@ -24,121 +37,380 @@ server = app.server
 # layout 的部分
 app.layout = create_layout()
 
-# 回調函數
-@app.callback(
-    [Output('graph-x', 'figure'),
-     Output('graph-y', 'figure'),
-     Output('graph-z', 'figure'),
-     Output('graph-mse-x', 'figure'),
-     Output('graph-mse-y', 'figure'),
-     Output('graph-mse-z', 'figure'),
-     Output('graph-std-x', 'figure'),
-     Output('graph-std-y', 'figure'),
-     Output('graph-std-z', 'figure'),
-     Output('graph-peak-x', 'figure'),
-     Output('graph-peak-y', 'figure'),
-     Output('graph-peak-z', 'figure'),
-     Output('graph-3d-xyz', 'figure'),
-     Output('graph-3d-mse', 'figure'),
-     Output('graph-3d-std', 'figure'),
-     Output('graph-3d-peak', 'figure'),
-     Output('real-time-data-table', 'data'),
-     Output('alarm-output', 'children'),
-     Output('alarm-output', 'style')],
-    [Input('interval-component', 'n_intervals'),
-     Input('date-picker-range', 'start_date'),
-     Input('date-picker-range', 'end_date'),
-     Input('submit-val', 'n_clicks')],
-    [State('date-picker-range', 'start_date'),
-     State('date-picker-range', 'end_date')]
-)
-def update_output(n_intervals, start_date, end_date, n_clicks, state_start_date, state_end_date):
-    clear_cache()  # 清除緩存，為了接收即時資訊
-    df_accel = fetch_filtered_data(state_start_date, state_end_date, 'AccelerometerData')
-    df_stats = fetch_filtered_data(state_start_date, state_end_date, 'StatisticsData')
-
-    if df_accel.empty or df_stats.empty:
+# 啟動時偵測設備欄位，確認 RECORDED_TIME (及 DEVICE_ID, RECORDED_TIME) 索引存在，並檢查區間查詢的執行計畫
+# 多個工作行程同時啟動時以檔案鎖排隊，索引只會建立一次
+detect_device_columns()
+with FileLock(lock_path('startup')).hold():
+    ensure_time_indexes()
+
+# 時間序列圖表：圖表 id、資料表、欄位、標題
+TIME_SERIES_GRAPHS = [
+    ('graph-x', 'AccelerometerData', 'XOUT', 'Time Series Data for XOUT'),
+    ('graph-y', 'AccelerometerData', 'YOUT', 'Time Series Data for YOUT'),
+    ('graph-z', 'AccelerometerData', 'ZOUT', 'Time Series Data for ZOUT'),
+    ('graph-mse-x', 'StatisticsData', 'MSE_X', 'Mean Squared Error (MSE) for X'),
+    ('graph-mse-y', 'StatisticsData', 'MSE_Y', 'Mean Squared Error (MSE) for Y'),
+    ('graph-mse-z', 'StatisticsData', 'MSE_Z', 'Mean Squared Error (MSE) for Z'),
+    ('graph-std-x', 'StatisticsData', 'STD_X', 'Standard Deviation (STD) for X'),
+    ('graph-std-y', 'StatisticsData', 'STD_Y', 'Standard Deviation (STD) for Y'),
+    ('graph-std-z', 'StatisticsData', 'STD_Z', 'Standard Deviation (STD) for Z'),
+]
+
+# 解析 relayoutData 中的 x 軸縮放區間，重設縮放時返回 None
+def parse_relayout_range(relayout_data):
+    if not relayout_data:
+        return None
+    if 'xaxis.range[0]' in relayout_data and 'xaxis.range[1]' in relayout_data:
+        return relayout_data['xaxis.range[0]'], relayout_data['xaxis.range[1]']
+    if 'xaxis.range' in relayout_data:
+        return tuple(relayout_data['xaxis.range'][:2])
+    return None
+
+# events 為異常事件，依 AXIS 標記在對應欄位的圖表上
+def _time_series_figures(df, graph_ids, events=None):
+    return [plot_time_series(df, 'RECORDED_TIME', column, title, events=_column_events(events, column))
+            for graph_id, _, column, title in TIME_SERIES_GRAPHS if graph_id in graph_ids]
+
+def _column_events(events, column):
+    if events is None or events.empty:
+        return None
+    return events[events['AXIS'] == column]
+
+# 圖表標記的異常事件：只取觸發 (RAISED) 事件
+def _anomaly_events(snapshot):
+    return snapshot.events(ANOMALY_RULE_NAMES, 'RAISED')
+
+def _frame_or_prevent(snapshot, table_name, **kwargs):
+    df = snapshot.frame(table_name, **kwargs)
+    return _require_data(df)
+
+def _require_data(df):
+    if df.empty:
         logger.warning("No data available for the selected date range")
         raise PreventUpdate
+    return df
 
-    logger.info("df_accel columns: %s", df_accel.columns)
-    logger.info("df_stats columns: %s", df_stats.columns)
-
-    # 繪製時間序列數據
-    time_series_x = plot_time_series(df_accel, 'RECORDED_TIME', 'XOUT', 'Time Series Data for XOUT')
-    time_series_y = plot_time_series(df_accel, 'RECORDED_TIME', 'YOUT', 'Time Series Data for YOUT')
-    time_series_z = plot_time_series(df_accel, 'RECORDED_TIME', 'ZOUT', 'Time Series Data for ZOUT')
+# 各分頁的圖表建構函數，只有分頁開啟時才會被呼叫；數據來自本週期共用的快照
+def build_xyz_figures(snapshot):
+    # 時間序列與曲面各有點數預算，並行查詢；超過預算時自動改讀彙總表，長區間不讀取原始資料
+    df_accel_plot, df_accel_surface = map(_require_data, snapshot.frames(TAB_DATA['tab-xyz']))
+    return [
+        *_time_series_figures(df_accel_plot, ['graph-x', 'graph-y', 'graph-z'], _anomaly_events(snapshot)),
+        plot_3d_surface(df_accel_surface, 'XOUT', 'YOUT', 'ZOUT', '3D Scatter Plot for XYZ Axis', device=snapshot.device)
+    ]
 
-    # 繪製MSE數據
-    mse_x = plot_time_series(df_stats, 'RECORDED_TIME', 'MSE_X', 'Mean Squared Error (MSE) for X')
-    mse_y = plot_time_series(df_stats, 'RECORDED_TIME', 'MSE_Y', 'Mean Squared Error (MSE) for Y')
-    mse_z = plot_time_series(df_stats, 'RECORDED_TIME', 'MSE_Z', 'Mean Squared Error (MSE) for Z')
+def build_mse_figures(snapshot):
+    df_stats = _frame_or_prevent(snapshot, 'StatisticsData')
+    return [
+        *_time_series_figures(df_stats, ['graph-mse-x', 'graph-mse-y', 'graph-mse-z']),
+        plot_3d_surface(df_stats, 'MSE_X', 'MSE_Y', 'MSE_Z', '3D Scatter Plot for MSE Data', device=snapshot.device)
+    ]
 
-    # 繪製STD數據
-    std_x = plot_time_series(df_stats, 'RECORDED_TIME', 'STD_X', 'Standard Deviation (STD) for X')
-    std_y = plot_time_series(df_stats, 'RECORDED_TIME', 'STD_Y', 'Standard Deviation (STD) for Y')
-    std_z = plot_time_series(df_stats, 'RECORDED_TIME', 'STD_Z', 'Standard Deviation (STD) for Z')
+def build_std_figures(snapshot):
+    df_stats = _frame_or_prevent(snapshot, 'StatisticsData')
+    return [
+        *_time_series_figures(df_stats, ['graph-std-x', 'graph-std-y', 'graph-std-z'], _anomaly_events(snapshot)),
+        plot_3d_surface(df_stats, 'STD_X', 'STD_Y', 'STD_Z', '3D Scatter Plot for STD Data', device=snapshot.device)
+    ]
 
+def build_peak_figures(snapshot):
+    df_stats = _frame_or_prevent(snapshot, 'StatisticsData')
     # 使用直條圖繪製峰值頻率數據
-    peak_freq_x = plot_frequency_spectrum(df_stats, 'RECORDED_TIME', 'PEAK_FREQ_X', 'Peak Frequency for X', 'bars')
-    peak_freq_y = plot_frequency_spectrum(df_stats, 'RECORDED_TIME', 'PEAK_FREQ_Y', 'Peak Frequency for Y', 'bars')
-    peak_freq_z = plot_frequency_spectrum(df_stats, 'RECORDED_TIME', 'PEAK_FREQ_Z', 'bars')
+    return [
+        plot_frequency_spectrum(df_stats, 'RECORDED_TIME', 'PEAK_FREQ_X', 'Peak Frequency for X', 'bars', device=snapshot.device),
+        plot_frequency_spectrum(df_stats, 'RECORDED_TIME', 'PEAK_FREQ_Y', 'Peak Frequency for Y', 'bars', device=snapshot.device),
+        plot_frequency_spectrum(df_stats, 'RECORDED_TIME', 'PEAK_FREQ_Z', 'Peak Frequency for Z', 'bars', device=snapshot.device),
+        plot_3d_surface(df_stats, 'PEAK_FREQ_X', 'PEAK_FREQ_Y', 'PEAK_FREQ_Z', '3D Scatter Plot for Peak Frequency Data', device=snapshot.device)
+    ]
+
+# 分頁值對應的輸出圖表與建構函數
+TAB_FIGURES = {
+    'tab-xyz': (['graph-x', 'graph-y', 'graph-z', 'graph-3d-xyz'], build_xyz_figures),
+    'tab-mse': (['graph-mse-x', 'graph-mse-y', 'graph-mse-z', 'graph-3d-mse'], build_mse_figures),
+    'tab-std': (['graph-std-x', 'graph-std-y', 'graph-std-z', 'graph-3d-std'], build_std_figures),
+    'tab-peak': (['graph-peak-x', 'graph-peak-y', 'graph-peak-z', 'graph-3d-peak'], build_peak_figures),
+}
+
+# 各分頁圖表所依據的數據框 (Snapshot.frame 的參數)，資料版本由這些數據框的列數與最新時間決定
+TAB_DATA = {
+    'tab-xyz': [('AccelerometerData', ['XOUT', 'YOUT', 'ZOUT'], DEFAULT_MAX_POINTS),
+                ('AccelerometerData', ['XOUT', 'YOUT', 'ZOUT'], SURFACE_MAX_POINTS)],
+    'tab-mse': [('StatisticsData',)],
+    'tab-std': [('StatisticsData',)],
+    'tab-peak': [('StatisticsData',)],
+}
+# 帶有異常標記的分頁，事件數量與最新事件時間也納入資料版本
+ANOMALY_MARKER_TABS = ('tab-xyz', 'tab-std')
+
+# 圖表緩存：區間、設備與資料版本相同時，圖表只建構一次，檢視同一區間的所有用戶端共用
+FIGURE_CACHE_SIZE = 32
+figure_cache = LRUCache(maxsize=FIGURE_CACHE_SIZE)
+figure_cache_lock = threading.Lock()
+
+def data_version(snapshot, tab_value):
+    versions = snapshot.versions(TAB_DATA[tab_value])
+    if tab_value in ANOMALY_MARKER_TABS:
+        versions.append(snapshot.events_version(ANOMALY_RULE_NAMES, 'RAISED'))
+    return repr((tab_value, str(snapshot.start_date), str(snapshot.end_date), snapshot.device, versions))
+
+def cached_figures(snapshot, tab_value, version, build_figures):
+    with figure_cache_lock:
+        figures = figure_cache.get(version)
+    if figures is not None:
+        metrics.counter('figure_cache_total', result='hit').inc()
+        return figures
+
+    metrics.counter('figure_cache_total', result='miss').inc()
+    figures = coalesce(('figures', version), lambda: build_figures(snapshot))
+    with figure_cache_lock:
+        figure_cache[version] = figures
+    return figures
+
+# 回調函數：每個分頁一個回調，未開啟的分頁不計算，切換分頁時才補上最新圖表。
+# 用戶端以 dcc.Store 記住目前圖表的資料版本，版本未變時返回 no_update，不重建也不重送圖表 (使用者的縮放也得以保留)
+def register_tab_callback(tab_value, graph_ids, build_figures):
+    @app.callback(
+        [Output(graph_id, 'figure') for graph_id in graph_ids] + [Output(f'version-{tab_value}', 'data')],
+        [Input('interval-component', 'n_intervals'),
+         Input('date-picker-range', 'start_date'),
+         Input('date-picker-range', 'end_date'),
+         Input('submit-val', 'n_clicks'),
+         Input('tabs', 'value'),
+         Input('device-dropdown', 'value')],
+        [State('date-picker-range', 'start_date'),
+         State('date-picker-range', 'end_date'),
+         State(f'version-{tab_value}', 'data')]
+    )
+    def update_tab(n_intervals, start_date, end_date, n_clicks, active_tab, device, state_start_date, state_end_date,
+                   client_version):
+        if active_tab != tab_value:
+            raise PreventUpdate
+        snapshot = get_snapshot(state_start_date, state_end_date, device=device)
+        version = data_version(snapshot, tab_value)
+        # 按下提交時一律重送，讓使用者可以重設縮放
+        if version == client_version and dash.ctx.triggered_id != 'submit-val':
+            metrics.counter('figure_cache_total', result='unchanged').inc()
+            return [dash.no_update] * (len(graph_ids) + 1)
+        return [*cached_figures(snapshot, tab_value, version, build_figures), version]
+
+for tab_value, (graph_ids, build_figures) in TAB_FIGURES.items():
+    register_tab_callback(tab_value, graph_ids, build_figures)
+
+# 請求計時：Dash 回調以輸出元件區分，其他路由以路由規則區分 (不用原始路徑，掃描器請求不會產生無限多的指標序列)；
+# PROFILE_REQUESTS=1 時另外輸出 cProfile 結果
+def _request_label():
+    if flask.request.path.endswith('_dash-update-component'):
+        body = flask.request.get_json(silent=True) or {}
+        return f"callback:{body.get('output', '')}"
+    rule = flask.request.url_rule
+    return rule.rule if rule is not None else 'unmatched'
+
+@app.server.before_request
+def start_request_timer():
+    flask.g.request_started = time.perf_counter()
+    flask.g.profile = metrics.start_profile()
+
+@app.server.after_request
+def record_request_metrics(response):
+    label = _request_label()
+    started = flask.g.pop('request_started', None)
+    if started is not None:
+        metrics.histogram('request_seconds', route=label).observe(time.perf_counter() - started)
+    metrics.counter('requests_total', route=label, status=str(response.status_code)).inc()
+    metrics.stop_profile(flask.g.pop('profile', None), label)
+    return response
+
+@app.server.route('/metrics')
+def metrics_endpoint():
+    for key, value in cache_stats().items():
+        metrics.gauge(f'dataframe_cache_{key}').set(value)
+    return flask.Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+# 回調回應 (圖表 JSON) 與版面超過門檻且用戶端接受 gzip 時壓縮；串流回應 (匯出、SSE) 與元件套件等靜態檔案不處理，
+# 靜態檔案每次重新壓縮的成本高於效益
+COMPRESS_MIN_BYTES = 1024
+COMPRESS_LEVEL = 5
+COMPRESS_PATH_SUFFIXES = ('_dash-update-component', '_dash-layout')
+
+@app.server.after_request
+def compress_response(response):
+    if response.direct_passthrough or response.is_streamed or response.status_code != 200:
+        return response
+    # 回應大小一律記錄，不論是否壓縮
+    data = response.get_data()
+    label = _request_label()
+    metrics.histogram('response_bytes', metrics.BYTES_BUCKETS, route=label).observe(len(data))
+    if ('Content-Encoding' in response.headers or len(data) < COMPRESS_MIN_BYTES
+            or not flask.request.path.endswith(COMPRESS_PATH_SUFFIXES)
+            or 'gzip' not in flask.request.headers.get('Accept-Encoding', '')):
+        return response
+
+    compressed = gzip.compress(data, compresslevel=COMPRESS_LEVEL)
+    metrics.histogram('response_compressed_bytes', metrics.BYTES_BUCKETS, route=label).observe(len(compressed))
+    response.set_data(compressed)
+    response.headers['Content-Encoding'] = 'gzip'
+    response.headers['Vary'] = 'Accept-Encoding'
+    logger.debug(f"Compressed {flask.request.path} from {len(data)} to {len(compressed)} bytes")
+    return response
+
+# 即時推送：瀏覽器經由 /stream (SSE) 接收新資料，每秒在用戶端以 extendData 附加到 XYZ 圖表，不經過伺服器回調
+LIVE_KEEPALIVE_SECONDS = 15
+
+app.clientside_callback(
+    ClientsideFunction(namespace='live', function_name='extendGraphs'),
+    [Output('graph-x', 'extendData'),
+     Output('graph-y', 'extendData'),
+     Output('graph-z', 'extendData')],
+    [Input('live-interval', 'n_intervals')],
+    [State('date-picker-range', 'end_date'),
+     State('device-dropdown', 'value')]
+)
 
-    # 繪製3D圖表
-    plot3d_xyz = plot_3d_surface(df_accel, 'XOUT', 'YOUT', 'ZOUT', '3D Scatter Plot for XYZ Axis')
-    plot3d_mse = plot_3d_surface(df_stats, 'MSE_X', 'MSE_Y', 'MSE_Z', '3D Scatter Plot for MSE Data')
-    plot3d_std = plot_3d_surface(df_stats, 'STD_X', 'STD_Y', 'STD_Z', '3D Scatter Plot for STD Data')
-    plot3d_peak = plot_3d_surface(df_stats, 'PEAK_FREQ_X', 'PEAK_FREQ_Y', 'PEAK_FREQ_Z', '3D Scatter Plot for Peak Frequency Data')
+@app.server.route('/stream')
+def stream_live_rows():
+    live_feed = get_live_feed(flask.request.args.get('device') or None)
+    subscriber = live_feed.subscribe()
+
+    def generate():
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                try:
+                    payload = subscriber.get(timeout=LIVE_KEEPALIVE_SECONDS)
+                except queue.Empty:
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"data: {payload}\n\n"
+        finally:
+            live_feed.unsubscribe(subscriber)
+
+    return flask.Response(
+        flask.stream_with_context(generate()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# 實時數據與警報的快速路徑：不建立任何圖表，只把上次之後的新資料交給警報與異常偵測引擎評估；
+# 事件由背景工作寫入資料庫，這裡的引擎只供顯示
+
+@app.callback(
+    [Output('real-time-data-table', 'data'),
+     Output('alarm-output', 'children'),
+     Output('alarm-output', 'style')],
+    [Input('interval-component', 'n_intervals'),
+     Input('device-dropdown', 'value')]
+)
+def update_real_time(n_intervals, device):
+    alarm_engine = get_alarm_engine(device)
+    raw_anomalies = get_anomaly_engine('AccelerometerData', device)
+    stats_anomalies = get_anomaly_engine('StatisticsData', device)
+    new_rows = fetch_new_rows([alarm_engine, raw_anomalies], 'AccelerometerData', device)
+    alarm_engine.process(new_rows)
+    raw_anomalies.process(new_rows)
+    stats_anomalies.process(fetch_new_rows([stats_anomalies], 'StatisticsData', device))
+    engines = [alarm_engine, raw_anomalies, stats_anomalies]
+
+    latest = new_rows if not new_rows.empty else fetch_latest_rows('AccelerometerData', columns=['XOUT', 'YOUT', 'ZOUT'], device=device)
 
     # 顯示實時數據，避免空值
     real_time_data = [
-        {"parameter": "XOUT", "value": df_accel['XOUT'].iloc[0] if not df_accel.empty else 'N/A'},
-        {"parameter": "YOUT", "value": df_accel['YOUT'].iloc[0] if not df_accel.empty else 'N/A'},
-        {"parameter": "ZOUT", "value": df_accel['ZOUT'].iloc[0] if not df_accel.empty else 'N/A'}
+        {"parameter": "XOUT", "value": latest['XOUT'].iloc[-1] if not latest.empty else 'N/A'},
+        {"parameter": "YOUT", "value": latest['YOUT'].iloc[-1] if not latest.empty else 'N/A'},
+        {"parameter": "ZOUT", "value": latest['ZOUT'].iloc[-1] if not latest.empty else 'N/A'}
     ]
 
-    # alarm
-    alarms = []
-    if not df_accel.empty:
-        if df_accel['XOUT'].iloc[0] > 9 or df_accel['XOUT'].iloc[0] < -9:
-            alarms.append("XOUT 超過範圍！")
-        if df_accel['YOUT'].iloc[0] > 9 or df_accel['YOUT'].iloc[0] < -9:
-            alarms.append("YOUT 超過範圍！")
-        if df_accel['ZOUT'].iloc[0] > 9 or df_accel['ZOUT'].iloc[0] < -9:
-            alarms.append("ZOUT 超過範圍！")
+    # alarm：目前仍在觸發中的規則 (含異常偵測)，以及最近的狀態變化
+    alarms = [message for engine in engines for message in engine.active_messages()]
+    events = sorted((event for engine in engines for event in engine.recent_events()),
+                    key=lambda event: event['RECORDED_TIME'])[-5:]
+    recent = [html.Div(f"{event['RECORDED_TIME']:%Y-%m-%d %H:%M:%S} {event['AXIS']} {event['RULE']} {event['STATE']}",
+                       className='small text-muted')
+              for event in events]
 
     alarm_style = {'display': 'block'} if alarms else {'display': 'none'}
-    alarm_message = html.Div(alarms, className='alarm') if alarms else None
+    alarm_message = html.Div([html.Div(alarm) for alarm in alarms] + recent, className='alarm') if alarms else None
+
+    return real_time_data, alarm_message, alarm_style
+
+# 使用者縮放時間序列圖表時，只針對可視區間重新降採樣，維持固定的傳輸點數
+def register_zoom_callback(graph_id, table_name, column, title):
+    @app.callback(
+        Output(graph_id, 'figure', allow_duplicate=True),
+        [Input(graph_id, 'relayoutData')],
+        [State('date-picker-range', 'start_date'),
+         State('date-picker-range', 'end_date'),
+         State('device-dropdown', 'value')],
+        prevent_initial_call=True
+    )
+    def update_zoom(relayout_data, start_date, end_date, device):
+        x_range = parse_relayout_range(relayout_data)
+        if x_range is None and not (relayout_data or {}).get('xaxis.autorange'):
+            raise PreventUpdate
+
+        # 縮放區間較小，彙總解析度會隨之變細，必要時回到原始資料
+        fetch_start, fetch_end = x_range if x_range is not None else (start_date, end_date)
+        df = fetch_filtered_data(fetch_start, fetch_end, table_name, columns=[column], max_points=DEFAULT_MAX_POINTS,
+                                 device=device)
+        if df.empty:
+            raise PreventUpdate
+        events = fetch_alarm_events(fetch_start, fetch_end, ANOMALY_RULE_NAMES, 'RAISED', device)
+        return plot_time_series(df, 'RECORDED_TIME', column, title, x_range=x_range,
+                                events=_column_events(events, column))
+
+for graph_spec in TIME_SERIES_GRAPHS:
+    register_zoom_callback(*graph_spec)
+
+# 設備選單：資料庫有設備欄位時才顯示，保留仍然存在的選取，否則預設第一台設備
+@app.callback(
+    [Output('device-dropdown', 'options'),
+     Output('device-dropdown', 'value'),
+     Output('device-selector', 'style')],
+    [Input('submit-val', 'n_clicks')],
+    [State('device-dropdown', 'value')]
+)
+def update_device_options(n_clicks, current_device):
+    devices = fetch_devices()
+    if not devices:
+        return [], None, {'display': 'none'}
+    options = [{'label': device, 'value': device} for device in devices]
+    return options, current_device if current_device in devices else devices[0], {'display': 'block'}
+
+# 設備總覽分頁：一次 GROUP BY 查詢取得所有設備的統計
+@app.callback(
+    [Output('fleet-table', 'data'),
+     Output('graph-fleet', 'figure')],
+    [Input('interval-component', 'n_intervals'),
+     Input('submit-val', 'n_clicks'),
+     Input('tabs', 'value')],
+    [State('date-picker-range', 'start_date'),
+     State('date-picker-range', 'end_date')]
+)
+def update_fleet_overview(n_intervals, n_clicks, active_tab, start_date, end_date):
+    if active_tab != 'tab-fleet':
+        raise PreventUpdate
+    summary = fetch_fleet_summary(start_date, end_date)
+    if summary.empty:
+        return [], plot_fleet_overview(summary, DEVICE_COLUMN, ROLLUP_AXES, 'Vibration RMS by Device')
 
-    return [
-        time_series_x, time_series_y, time_series_z,
-        mse_x, mse_y, mse_z,
-        std_x, std_y, std_z,
-        peak_freq_x, peak_freq_y, peak_freq_z,
-        plot3d_xyz, plot3d_mse, plot3d_std, plot3d_peak,
-        real_time_data, alarm_message, alarm_style
-    ]
+    table = summary.assign(RECORDED_TIME=summary['RECORDED_TIME'].dt.strftime('%Y-%m-%d %H:%M'))
+    return table.to_dict('records'), plot_fleet_overview(summary, DEVICE_COLUMN, ROLLUP_AXES, 'Vibration RMS by Device')
 
 @app.callback(
     [Output('week-comparison-dropdown', 'options'),
      Output('week-comparison-dropdown', 'value')],
-    [Input('submit-val', 'n_clicks')],
+    [Input('submit-val', 'n_clicks'),
+     Input('device-dropdown', 'value')],
     [State('date-picker-range', 'start_date'),
      State('date-picker-range', 'end_date')]
 )
-def update_week_options(n_clicks, start_date, end_date):
-    clear_cache()  # 清除緩存
-    df_accel = fetch_filtered_data(start_date, end_date, 'AccelerometerData')
+def update_week_options(n_clicks, device, start_date, end_date):
+    weeks = fetch_week_starts(start_date, end_date, device)
 
-    if df_accel.empty:
+    if not weeks:
         logger.warning(f"No data available for the selected date range: {start_date} to {end_date}")
         return [], []
 
-    df_accel['WEEK'] = df_accel['RECORDED_TIME'].dt.to_period('W').apply(lambda r: r.start_time)
-
-    weeks = df_accel['WEEK'].drop_duplicates().sort_values()
-    options = [{'label': f'Week starting {week}', 'value': str(week)} for week in weeks]
-
+    options = [{'label': f'Week starting {week:%Y-%m-%d}', 'value': str(week)} for week in weeks]
     return options, []
 
 @app.callback(
@@ -146,30 +418,20 @@ def update_week_options(n_clicks, start_date, end_date):
     [Input('week-comparison-dropdown', 'value'),
      Input('data-type-dropdown', 'value')],
     [State('date-picker-range', 'start_date'),
-     State('date-picker-range', 'end_date')]
+     State('date-picker-range', 'end_date'),
+     State('device-dropdown', 'value')]
 )
-def update_combined_plot(selected_weeks, selected_data_type, start_date, end_date):
-    clear_cache()  # 清除緩存
+def update_combined_plot(selected_weeks, selected_data_type, start_date, end_date, device):
     if not selected_weeks or not selected_data_type:
         raise PreventUpdate
 
-    plots = []
-    for week in selected_weeks:
-        start_of_week = pd.to_datetime(week)
-        end_of_week = start_of_week + pd.DateOffset(days=7)
-        if selected_data_type in ['XOUT', 'YOUT', 'ZOUT']:
-            df_week = fetch_filtered_data(start_of_week, end_of_week, 'AccelerometerData')
-        else:
-            df_week = fetch_filtered_data(start_of_week, end_of_week, 'StatisticsData')
-        df_week['WEEK'] = week
-
-        logger.info(f"Week: {week}, Columns: {df_week.columns}")
+    weeks = [pd.Timestamp(week) for week in selected_weeks]
+    table_name = 'AccelerometerData' if selected_data_type in ['XOUT', 'YOUT', 'ZOUT'] else 'StatisticsData'
+    df_weeks = fetch_weeks(weeks, table_name, [selected_data_type], max_points=DEFAULT_MAX_POINTS, device=device)
 
-        plot_title = f"{selected_data_type} for Week {week}"
-        plot = create_combined_plot(df_week, 'RECORDED_TIME', [selected_data_type], plot_title)
-        plots.append(dcc.Graph(figure=plot))
-
-    return plots
+    plot_title = f"{selected_data_type} by Time of Week"
+    plot = plot_week_comparison(df_weeks, 'RECORDED_TIME', selected_data_type, weeks, plot_title)
+    return [dcc.Graph(figure=plot)]
 
 @app.callback(
     Output('theme', 'children'),
@@ -190,34 +452,65 @@ def switch_theme(dark_clicks, light_clicks):
 
     return [html.Link(href=theme, rel='stylesheet')]
 
+# 下載連結只帶查詢條件，實際資料由 /export 串流輸出
 @app.callback(
-    Output('download-link', 'href'),
+    [Output('download-link', 'href'),
+     Output('download-link', 'download')],
     [Input('export-data', 'n_clicks')],
     [State('date-picker-range', 'start_date'), 
-     State('date-picker-range', 'end_date')]
+     State('date-picker-range', 'end_date'),
+     State('export-format', 'value'),
+     State('export-gzip', 'value'),
+     State('device-dropdown', 'value')]
 )
-def update_download_link(n_clicks, start_date, end_date):
-    if n_clicks is None or start_date is None or end_date is None:
-        return dash.no_update
-    
-    df = fetch_filtered_data(start_date, end_date, 'AccelerometerData')
-    if df.empty:
-        return dash.no_update
-
-    csv_string = df.to_csv(index=False, encoding='utf-8')
-    b64 = base64.b64encode(csv_string.encode()).decode()
-    
-    return f"/downloadCSV?data={b64}"
-
-@app.server.route('/downloadCSV')
-def download_csv():
-    data = flask.request.args.get('data')
-    csv_string = base64.b64decode(data).decode('utf-8')
-    return flask.Response(
-        csv_string,
-        mimetype="text/csv",
-        headers={"Content-disposition": "attachment; filename=sensor_data.csv"}
-    )
+def update_download_link(n_clicks, start_date, end_date, export_format, export_gzip, device):
+    if not n_clicks or start_date is None or end_date is None:
+        return dash.no_update, dash.no_update
+
+    params = {'table': 'AccelerometerData', 'start': start_date, 'end': end_date, 'format': export_format}
+    filename = f"sensor_data.{EXPORT_FORMATS[export_format][1]}"
+    if device:
+        params['device'] = device
+        filename = f"sensor_data_{device}.{EXPORT_FORMATS[export_format][1]}"
+    if export_gzip:
+        params['gzip'] = '1'
+        filename += '.gz'
+    return f"/export?{urllib.parse.urlencode(params)}", filename
+
+@app.server.route('/export')
+def export_data():
+    args = flask.request.args
+    table_name = args.get('table', 'AccelerometerData')
+    export_format = args.get('format', 'csv')
+    start_date, end_date = args.get('start'), args.get('end')
+    if table_name not in ('AccelerometerData', 'StatisticsData') or export_format not in EXPORT_FORMATS:
+        flask.abort(400)
+    if start_date is None or end_date is None:
+        flask.abort(400)
+    # 日期在開始串流前驗證：串流開始後狀態碼已送出 200，之後的錯誤只會讓下載被截斷
+    try:
+        bounds = [pd.Timestamp(start_date), pd.Timestamp(end_date)]
+    except ValueError:
+        flask.abort(400)
+    if any(pd.isna(bound) for bound in bounds):
+        flask.abort(400)
+    if export_format == 'parquet' and not parquet_available():
+        flask.abort(501, description="Parquet export requires pyarrow")
+
+    chunks = iter_range_chunks(table_name, start_date, end_date, device=args.get('device') or None)
+    stream = iter_parquet(chunks) if export_format == 'parquet' else iter_csv(chunks)
+    mimetype, extension = EXPORT_FORMATS[export_format]
+    filename = f"{table_name}.{extension}"
+    headers = {"Content-disposition": f"attachment; filename={filename}"}
+    if args.get('gzip') == '1':
+        stream = iter_gzip(stream)
+        headers["Content-disposition"] += ".gz"
+        mimetype = 'application/gzip'
+
+    return flask.Response(flask.stream_with_context(stream), mimetype=mimetype, headers=headers)
 
 if __name__ == '__main__':
+    # debug 模式的重新載入器會啟動兩個行程，只在實際服務的子行程啟動背景工作
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        start_background_worker()
     app.run_server(debug=True)
@@ -0,0 +1,58 @@
+// 即時推送：透過 SSE 接收新的感測器資料，暫存後由 clientside callback 以 extendData 附加到圖表
+(function () {
+    var LIVE_MAX_POINTS = 20000;  // 每條曲線在瀏覽器端保留的最大點數
+    var AXES = ['XOUT', 'YOUT', 'ZOUT'];
+    var buffer = {RECORDED_TIME: [], XOUT: [], YOUT: [], ZOUT: []};
+    var source = null;
+    var sourceDevice;
+
+    // 選取的設備改變時關閉舊連線，改訂閱該設備的推送，並丟棄尚未附加的舊設備資料
+    function connect(device) {
+        if (!window.EventSource || (source && sourceDevice === device)) {
+            return;
+        }
+        if (source) {
+            source.close();
+        }
+        buffer = {RECORDED_TIME: [], XOUT: [], YOUT: [], ZOUT: []};
+        sourceDevice = device;
+        source = new EventSource(device ? '/stream?device=' + encodeURIComponent(device) : '/stream');
+        source.onmessage = function (event) {
+            var rows = JSON.parse(event.data);
+            Object.keys(buffer).forEach(function (column) {
+                Array.prototype.push.apply(buffer[column], rows[column]);
+            });
+        };
+    }
+
+    function today() {
+        var now = new Date();
+        var month = String(now.getMonth() + 1).padStart(2, '0');
+        var day = String(now.getDate()).padStart(2, '0');
+        return now.getFullYear() + '-' + month + '-' + day;
+    }
+
+    window.dash_clientside = Object.assign({}, window.dash_clientside, {
+        live: {
+            extendGraphs: function (nIntervals, endDate, device) {
+                var noUpdate = window.dash_clientside.no_update;
+                connect(device || null);
+                var times = buffer.RECORDED_TIME;
+                if (!times.length) {
+                    return [noUpdate, noUpdate, noUpdate];
+                }
+                var drained = buffer;
+                buffer = {RECORDED_TIME: [], XOUT: [], YOUT: [], ZOUT: []};
+
+                // 只有選取區間包含今天時才附加，避免把即時資料畫到歷史區間上
+                if (!endDate || String(endDate).slice(0, 10) < today()) {
+                    return [noUpdate, noUpdate, noUpdate];
+                }
+                // 主曲線是最後一條 trace (彙總資料時前面還有最小/最大值色帶，以及異常事件標記)
+                return AXES.map(function (axis) {
+                    return [{x: [drained.RECORDED_TIME], y: [drained[axis]]}, [-1], LIVE_MAX_POINTS];
+                });
+            }
+        }
+    });
+})();
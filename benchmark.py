@@ -0,0 +1,218 @@
+import os
+import gc
+import json
+import time
+import argparse
+import platform
+import statistics
+import subprocess
+import tracemalloc
+import logging
+
+import numpy as np
+import pandas as pd
+from plotly.io.json import to_json_plotly
+
+import data
+
+# 基準測試：產生模擬的 ADXL335 三軸資料寫入 SQLite 替身資料庫，量測各階段的延遲、峰值記憶體與圖表負載大小
+
+BENCHMARK_SIZES = [10_000, 1_000_000, 10_000_000]
+BENCHMARK_DIR = 'benchmarks'
+BENCHMARK_RESULTS = os.path.join(BENCHMARK_DIR, 'results.jsonl')
+BENCHMARK_START = pd.Timestamp('2024-01-01')
+SAMPLE_RATE_HZ = 100
+GENERATE_CHUNK_ROWS = 500_000
+REGRESSION_TOLERANCE = 1.25   # 延遲或峰值記憶體超過上次結果的倍數即標記為退化
+# 差距小於此絕對值時不標記，避免毫秒級的量測雜訊被誤判
+REGRESSION_MIN_DELTA = {'latency_s': 0.02, 'peak_mb': 2.0, 'payload_bytes': 1024}
+
+# 模擬感測器：Z 軸帶重力，三軸各有兩個機械振動頻率、緩慢的振幅調變、白雜訊與偶發衝擊
+def generate_accelerometer(n_rows, offset=0, rate_hz=SAMPLE_RATE_HZ, seed=0):
+    rng = np.random.default_rng(seed + offset)
+    index = np.arange(offset, offset + n_rows)
+    t = index / rate_hz
+    times = BENCHMARK_START + pd.to_timedelta(index * (1_000_000 // rate_hz), unit='us')
+
+    frame = {'RECORDED_TIME': times}
+    for axis, (f1, f2, bias) in {'XOUT': (12.0, 37.0, 0.0), 'YOUT': (15.5, 41.0, 0.0), 'ZOUT': (9.0, 28.0, 9.81)}.items():
+        envelope = 1.0 + 0.5 * np.sin(2 * np.pi * t / 3600.0)
+        signal = envelope * (0.8 * np.sin(2 * np.pi * f1 * t) + 0.3 * np.sin(2 * np.pi * f2 * t))
+        shocks = np.where(rng.random(n_rows) < 1e-4, rng.normal(0, 6.0, n_rows), 0.0)
+        frame[axis] = bias + signal + rng.normal(0, 0.2, n_rows) + shocks
+    return pd.DataFrame(frame)
+
+# 建立 (或沿用) 指定列數的 SQLite 資料庫；StatisticsData 以背景工作的特徵計算產生
+def build_database(n_rows, db_dir):
+    from worker import compute_window_features
+
+    os.makedirs(db_dir, exist_ok=True)
+    path = os.path.join(db_dir, f'adxl335_{n_rows}.db')
+    url = f'sqlite:///{path}'
+    if os.path.exists(path):
+        return url
+
+    tmp_path = path + '.tmp'
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    engine = data.create_db_engine(f'sqlite:///{tmp_path}')
+    for offset in range(0, n_rows, GENERATE_CHUNK_ROWS):
+        chunk = generate_accelerometer(min(GENERATE_CHUNK_ROWS, n_rows - offset), offset)
+        chunk.to_sql('AccelerometerData', engine, if_exists='append', index=False, chunksize=100_000)
+        compute_window_features(chunk).to_sql('StatisticsData', engine, if_exists='append', index=False)
+    engine.dispose()
+    os.replace(tmp_path, path)
+    return url
+
+def _payload_bytes(result):
+    figures = result if isinstance(result, (list, tuple)) else [result]
+    return sum(len(to_json_plotly(figure)) for figure in figures if hasattr(figure, 'to_plotly_json'))
+
+# 延遲取多次執行的中位數；峰值記憶體另以 tracemalloc 單獨執行一次，避免追蹤開銷影響計時
+def measure(func, setup=None, repeat=3):
+    latencies = []
+    result = None
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        gc.collect()
+        started = time.perf_counter()
+        result = func()
+        latencies.append(time.perf_counter() - started)
+
+    if setup is not None:
+        setup()
+    gc.collect()
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'latency_s': statistics.median(latencies),
+        'peak_mb': peak / 1024 / 1024,
+        'payload_bytes': _payload_bytes(result),
+    }
+
+def run_stages(n_rows, repeat):
+    from spectral import segment_cache
+    from plots import plot_time_series, plot_frequency_spectrum, plot_3d_surface, surface_cache, DEFAULT_MAX_POINTS
+    from app import TAB_FIGURES, data_version, cached_figures, figure_cache
+
+    start = BENCHMARK_START.strftime('%Y-%m-%d')
+    end = (BENCHMARK_START + pd.Timedelta(seconds=n_rows / SAMPLE_RATE_HZ)).strftime('%Y-%m-%d')
+    data.refresh_rollups(force=True)
+
+    def cold():
+        data.clear_cache()
+        segment_cache.clear()
+        surface_cache.clear()
+        figure_cache.clear()
+
+    accel = data.fetch_filtered_data(start, end, 'AccelerometerData')
+    stats = data.fetch_filtered_data(start, end, 'StatisticsData')
+
+    def render_tabs():
+        snapshot = data.get_snapshot(start, end, tick=time.monotonic())
+        figures = []
+        for _, build_figures in TAB_FIGURES.values():
+            figures += build_figures(snapshot)
+        return figures
+
+    # 新的刷新週期但資料未變：只計算資料版本，圖表取自緩存 (其他用戶端) 或完全不重送 (同一用戶端)
+    def render_tabs_memoized():
+        snapshot = data.get_snapshot(start, end, tick=time.monotonic())
+        figures = []
+        for tab_value, (_, build_figures) in TAB_FIGURES.items():
+            figures += cached_figures(snapshot, tab_value, data_version(snapshot, tab_value), build_figures)
+        return figures
+
+    def render_tabs_unchanged():
+        snapshot = data.get_snapshot(start, end, tick=time.monotonic())
+        return [data_version(snapshot, tab_value) for tab_value in TAB_FIGURES]
+
+    stages = {
+        'fetch_filtered_data.cold': (lambda: data.fetch_filtered_data(start, end, 'AccelerometerData'), cold),
+        'fetch_filtered_data.warm': (lambda: data.fetch_filtered_data(start, end, 'AccelerometerData'), None),
+        'fetch_filtered_data.rollup': (lambda: data.fetch_filtered_data(start, end, 'AccelerometerData',
+                                                                        columns=['XOUT'], max_points=DEFAULT_MAX_POINTS), cold),
+        'plot_time_series': (lambda: plot_time_series(accel, 'RECORDED_TIME', 'XOUT', 'XOUT'), None),
+        'plot_frequency_spectrum.cold': (lambda: plot_frequency_spectrum(accel, 'RECORDED_TIME', 'XOUT', 'XOUT'),
+                                         segment_cache.clear),
+        'plot_frequency_spectrum.warm': (lambda: plot_frequency_spectrum(accel, 'RECORDED_TIME', 'XOUT', 'XOUT'), None),
+        'plot_3d_surface': (lambda: plot_3d_surface(accel, 'XOUT', 'YOUT', 'ZOUT', 'XYZ'), surface_cache.clear),
+        'plot_3d_surface.stats': (lambda: plot_3d_surface(stats, 'MSE_X', 'MSE_Y', 'MSE_Z', 'MSE'), surface_cache.clear),
+        'render_tabs.cold': (render_tabs, cold),
+        'render_tabs.memoized': (render_tabs_memoized, None),
+        'render_tabs.unchanged': (render_tabs_unchanged, None),
+    }
+
+    results = {}
+    for name, (func, setup) in stages.items():
+        results[name] = measure(func, setup, repeat)
+        logging.getLogger(__name__).info(f"{n_rows} rows {name}: {results[name]}")
+    return results
+
+def _git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except Exception:
+        return None
+
+def load_previous(results_path):
+    previous = {}
+    if not os.path.exists(results_path):
+        return previous
+    with open(results_path) as f:
+        for line in f:
+            record = json.loads(line)
+            previous[(record['rows'], record['stage'])] = record
+    return previous
+
+# 與同一列數、同一階段的上一筆紀錄比較
+def flag_regressions(record, previous):
+    last = previous.get((record['rows'], record['stage']))
+    if last is None:
+        return []
+    flags = []
+    for metric, min_delta in REGRESSION_MIN_DELTA.items():
+        if record[metric] > last[metric] * REGRESSION_TOLERANCE and record[metric] - last[metric] > min_delta:
+            flags.append(f"{metric} {last[metric]:.4g} -> {record[metric]:.4g}")
+    return flags
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark data loading and figure building.')
+    parser.add_argument('--rows', type=int, nargs='+', default=BENCHMARK_SIZES)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--db-dir', default=os.path.join(BENCHMARK_DIR, 'data'))
+    parser.add_argument('--results', default=BENCHMARK_RESULTS)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    previous = load_previous(args.results)
+    run = {'timestamp': pd.Timestamp.now().isoformat(timespec='seconds'), 'revision': _git_revision(),
+           'python': platform.python_version()}
+
+    regressions = []
+    os.makedirs(os.path.dirname(args.results) or '.', exist_ok=True)
+    with open(args.results, 'a') as out:
+        for n_rows in args.rows:
+            data.configure_engine(build_database(n_rows, args.db_dir))
+            data.ensure_time_indexes()
+            for stage, metrics in run_stages(n_rows, args.repeat).items():
+                record = {**run, 'rows': n_rows, 'stage': stage, **metrics}
+                flags = flag_regressions(record, previous)
+                record['regressions'] = flags
+                out.write(json.dumps(record) + '\n')
+                regressions += [(n_rows, stage, flag) for flag in flags]
+                print(f"{n_rows:>10} {stage:<32} {metrics['latency_s'] * 1000:10.1f} ms "
+                      f"{metrics['peak_mb']:10.1f} MB {metrics['payload_bytes']:>12} B"
+                      + ("  REGRESSION" if flags else ""))
+
+    for n_rows, stage, flag in regressions:
+        print(f"Regression: {n_rows} rows {stage}: {flag}")
+    return 1 if regressions else 0
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,77 @@
+import io
+import zlib
+import logging
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet 匯出為選用功能
+    pa = None
+    pq = None
+
+# 設置日誌記錄
+logger = logging.getLogger(__name__)
+
+# 匯出格式對應的 MIME 類型與副檔名
+EXPORT_FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+}
+
+def parquet_available():
+    return pq is not None
+
+# 逐塊輸出 CSV，只有第一塊帶欄位標題
+def iter_csv(chunks):
+    header = True
+    for chunk in chunks:
+        yield chunk.to_csv(index=False, header=header).encode('utf-8')
+        header = False
+
+# ParquetWriter 需要能回報目前位置的檔案物件，這裡記錄總長度但只暫存尚未送出的位元組
+class _StreamSink(io.RawIOBase):
+    def __init__(self):
+        self._pending = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._pending.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self):
+        data = b''.join(self._pending)
+        self._pending = []
+        return data
+
+# 每個資料塊寫成一個 row group，寫完即送出，記憶體用量與匯出總量無關
+def iter_parquet(chunks):
+    sink = _StreamSink()
+    writer = None
+    schema = None
+    try:
+        for chunk in chunks:
+            table = pa.Table.from_pandas(chunk, schema=schema, preserve_index=False)
+            if writer is None:
+                schema = table.schema
+                writer = pq.ParquetWriter(sink, schema, compression='snappy')
+            writer.write_table(table)
+            yield sink.drain()
+    finally:
+        if writer is not None:
+            writer.close()
+    yield sink.drain()
+
+def iter_gzip(stream):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for data in stream:
+        compressed = compressor.compress(data)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
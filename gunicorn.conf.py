@@ -0,0 +1,15 @@
+import os
+import multiprocessing
+
+# gunicorn 設定，所有值都可用環境變數覆寫
+bind = os.environ.get('BIND', '0.0.0.0:8050')
+workers = int(os.environ.get('WEB_CONCURRENCY', min(multiprocessing.cpu_count() * 2 + 1, 8)))
+# 每個 /stream (SSE) 連線佔用一個執行緒，即時推送的用戶端多時需提高執行緒數
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', 8))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 60))   # 大於單次查詢的延遲預算 (QUERY_TIMEOUT_SECONDS)
+graceful_timeout = 30
+keepalive = 5
+# 工作行程之間共用數據框緩存
+raw_env = ['SHARED_CACHE=' + os.environ.get('SHARED_CACHE', '1')]
+accesslog = '-'
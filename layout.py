@@ -63,13 +63,37 @@ def create_layout():
         className="mb-3"
     )
 
+    # 設備選擇：資料庫沒有設備欄位時保持隱藏
+    device_selector = html.Div(
+        dcc.Dropdown(
+            id='device-dropdown',
+            options=[],
+            value=None,
+            clearable=False,
+            placeholder='選擇設備',
+            style={'minWidth': '180px'}
+        ),
+        id='device-selector',
+        style={'display': 'none'},
+        className="mb-3 mx-2"
+    )
+
     layout = dbc.Container([
         navbar,
         dbc.Row([
             dbc.Col([
+                device_selector,
                 date_picker,
                 html.Button('提交', id='submit-val', n_clicks=0, className="btn btn-primary mb-3"),
                 html.Button('導出數據', id='export-data', n_clicks=0, className="btn btn-secondary mb-3"),
+                dcc.RadioItems(
+                    id='export-format',
+                    options=[{'label': 'CSV', 'value': 'csv'}, {'label': 'Parquet', 'value': 'parquet'}],
+                    value='csv',
+                    inline=True,
+                    className="mb-3 mx-2"
+                ),
+                dcc.Checklist(id='export-gzip', options=[{'label': 'gzip', 'value': 'gzip'}], value=[], className="mb-3 mx-2"),
                 html.A('下載數據', id='download-link', download="data.csv", href="", target="_blank", className="btn btn-info mb-3")
             ], width=12, className="d-flex justify-content-center")
         ]),
@@ -78,9 +102,16 @@ def create_layout():
             interval=60000,  # 60 seconds
             n_intervals=0
         ),
+        # 各分頁目前顯示的圖表資料版本，版本未變時伺服器不重送圖表
+        *[dcc.Store(id=f'version-{tab}', storage_type='memory') for tab in ('tab-xyz', 'tab-mse', 'tab-std', 'tab-peak')],
+        dcc.Interval(
+            id='live-interval',
+            interval=1000,  # 1 second，只在瀏覽器端附加 SSE 推送的新資料
+            n_intervals=0
+        ),
         dbc.Row(dbc.Col(html.H1("感測器數據監控", className="text-center text-primary mb-4 fade-in"), width=12)),
-        dcc.Tabs(id="tabs", children=[
-            dcc.Tab(label='XYZ 數據', children=[
+        dcc.Tabs(id="tabs", value='tab-xyz', children=[
+            dcc.Tab(label='XYZ 數據', value='tab-xyz', children=[
                 dbc.Row([
                     dbc.Col(create_card("X 軸數據", 'graph-x', "dark"), width=12, lg=4),
                     dbc.Col(create_card("Y 軸數據", 'graph-y', "success"), width=12, lg=4),
@@ -88,7 +119,7 @@ def create_layout():
                     dbc.Col(create_card("3D XYZ 軸數據", 'graph-3d-xyz', "dark"), width=12)
                 ]),
             ]),
-            dcc.Tab(label='MSE 數據', children=[
+            dcc.Tab(label='MSE 數據', value='tab-mse', children=[
                 dbc.Row([
                     dbc.Col(create_card("Mean Squared Error X", 'graph-mse-x', "warning"), width=12, lg=4),
                     dbc.Col(create_card("Mean Squared Error Y", 'graph-mse-y', "danger"), width=12, lg=4),
@@ -96,7 +127,7 @@ def create_layout():
                     dbc.Col(create_card("3D MSE 數據", 'graph-3d-mse', "dark"), width=12)
                 ]),
             ]),
-            dcc.Tab(label='STD 數據', children=[
+            dcc.Tab(label='STD 數據', value='tab-std', children=[
                 dbc.Row([
                     dbc.Col(create_card("Standard Deviation X", 'graph-std-x', "dark"), width=12, lg=4),
                     dbc.Col(create_card("Standard Deviation Y", 'graph-std-y', "primary"), width=12, lg=4),
@@ -104,7 +135,7 @@ def create_layout():
                     dbc.Col(create_card("3D STD 數據", 'graph-3d-std', "dark"), width=12)
                 ]),
             ]),
-            dcc.Tab(label='峰值頻率數據', children=[
+            dcc.Tab(label='峰值頻率數據', value='tab-peak', children=[
                 dbc.Row([
                     dbc.Col(create_card("Peak Frequency X", 'graph-peak-x', "info"), width=12, lg=4),
                     dbc.Col(create_card("Peak Frequency Y", 'graph-peak-y', "warning"), width=12, lg=4),
@@ -112,7 +143,7 @@ def create_layout():
                     dbc.Col(create_card("3D Peak Frequency 數據", 'graph-3d-peak', "dark"), width=12)
                 ]),
             ]),
-            dcc.Tab(label='實時數據', children=[
+            dcc.Tab(label='實時數據', value='tab-realtime', children=[
                 dbc.Row([
                     dbc.Col(dbc.Card([
                         dbc.CardHeader("實時數據", className="bg-primary text-white text-center"),
@@ -132,7 +163,35 @@ def create_layout():
                     ], className="mb-4 shadow-sm"), width=12, lg=4)
                 ]),
             ]),
-            dcc.Tab(label='周數比較', children=[
+            dcc.Tab(label='設備總覽', value='tab-fleet', children=[
+                dbc.Row([
+                    dbc.Col(dbc.Card([
+                        dbc.CardHeader("設備總覽", className="bg-primary text-white text-center"),
+                        dbc.CardBody([
+                            dash_table.DataTable(
+                                id='fleet-table',
+                                columns=[
+                                    {"name": "Device", "id": "DEVICE_ID"},
+                                    {"name": "Samples", "id": "SAMPLE_COUNT"},
+                                    {"name": "Last Hour", "id": "RECORDED_TIME"},
+                                    {"name": "X RMS", "id": "XOUT_RMS", "type": "numeric", "format": {"specifier": ".3f"}},
+                                    {"name": "Y RMS", "id": "YOUT_RMS", "type": "numeric", "format": {"specifier": ".3f"}},
+                                    {"name": "Z RMS", "id": "ZOUT_RMS", "type": "numeric", "format": {"specifier": ".3f"}},
+                                    {"name": "X Max", "id": "XOUT_MAX", "type": "numeric", "format": {"specifier": ".3f"}},
+                                    {"name": "Y Max", "id": "YOUT_MAX", "type": "numeric", "format": {"specifier": ".3f"}},
+                                    {"name": "Z Max", "id": "ZOUT_MAX", "type": "numeric", "format": {"specifier": ".3f"}},
+                                ],
+                                data=[],
+                                sort_action='native',
+                                style_table={'overflowX': 'auto'},
+                                style_cell={'textAlign': 'left'},
+                            ),
+                        ], className="fade-in")
+                    ], className="mb-4 shadow-sm"), width=12),
+                    dbc.Col(create_card("設備振動 RMS 比較", 'graph-fleet', "dark"), width=12)
+                ]),
+            ]),
+            dcc.Tab(label='周數比較', value='tab-week', children=[
                 dbc.Row([
                     dbc.Col([
                         dcc.Dropdown(
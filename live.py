@@ -0,0 +1,98 @@
+import json
+import queue
+import threading
+import logging
+
+from data import fetch_latest_rows, fetch_rows_after
+
+# 設置日誌記錄
+logger = logging.getLogger(__name__)
+
+LIVE_POLL_SECONDS = 1.0        # 背景執行緒檢查新資料的間隔
+LIVE_MAX_BATCH_ROWS = 5000     # 單次推送的最大列數
+LIVE_QUEUE_SIZE = 100          # 每個用戶端最多暫存的批次，過慢的用戶端會被丟棄舊批次
+LIVE_AXES = ['XOUT', 'YOUT', 'ZOUT']
+
+# 單一背景執行緒輪詢新資料並廣播給所有訂閱者，資料庫查詢次數與用戶端數量無關
+class LiveFeed:
+    def __init__(self, table_name='AccelerometerData', columns=LIVE_AXES, poll_seconds=LIVE_POLL_SECONDS, device=None):
+        self.device = device
+        self.table_name = table_name
+        self.columns = columns
+        self.poll_seconds = poll_seconds
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._watermark = None
+
+    def subscribe(self):
+        subscriber = queue.Queue(maxsize=LIVE_QUEUE_SIZE)
+        with self._lock:
+            self._subscribers.add(subscriber)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name=f'live-feed-{self.device or "all"}', daemon=True)
+                self._thread.start()
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def _run(self):
+        stop = threading.Event()
+        while not stop.wait(self.poll_seconds):
+            with self._lock:
+                if not self._subscribers:
+                    self._thread = None
+                    return
+                subscribers = list(self._subscribers)
+            try:
+                payload = self._poll()
+            except Exception as e:
+                logger.error(f"Error polling live data: {e}")
+                continue
+            if payload is not None:
+                for subscriber in subscribers:
+                    self._publish(subscriber, payload)
+
+    def _poll(self):
+        if self._watermark is None:
+            latest = fetch_latest_rows(self.table_name, columns=['RECORDED_TIME'], device=self.device)
+            if latest.empty:
+                return None
+            self._watermark = latest['RECORDED_TIME'].iloc[-1]
+            return None
+
+        rows = fetch_rows_after(self.table_name, self._watermark, self.columns, LIVE_MAX_BATCH_ROWS, self.device)
+        if rows.empty:
+            return None
+        self._watermark = rows['RECORDED_TIME'].iloc[-1]
+
+        # 時間以毫秒 epoch 傳送，與圖表中的 typed array 時間軸一致，extendData 才能直接附加
+        times = rows['RECORDED_TIME'].to_numpy(dtype='datetime64[ms]').astype('int64')
+        batch = {'RECORDED_TIME': times.tolist()}
+        for column in self.columns:
+            batch[column] = rows[column].tolist()
+        return json.dumps(batch)
+
+    @staticmethod
+    def _publish(subscriber, payload):
+        try:
+            subscriber.put_nowait(payload)
+        except queue.Full:
+            try:
+                subscriber.get_nowait()
+            except queue.Empty:
+                pass
+            subscriber.put_nowait(payload)
+
+# 每台設備一個推送來源，同一設備的所有用戶端共用一個輪詢執行緒
+_feeds = {}
+_feeds_lock = threading.Lock()
+
+def get_live_feed(device=None):
+    with _feeds_lock:
+        feed = _feeds.get(device)
+        if feed is None:
+            feed = _feeds[device] = LiveFeed(device=device)
+        return feed
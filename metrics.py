@@ -0,0 +1,132 @@
+import os
+import time
+import cProfile
+import threading
+import functools
+from contextlib import contextmanager
+
+# 輕量的程序內指標：計數器與直方圖依 (名稱, 標籤) 儲存，/metrics 以 Prometheus 文字格式輸出
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BYTES_BUCKETS = (1024, 10 * 1024, 100 * 1024, 1024 ** 2, 10 * 1024 ** 2, 100 * 1024 ** 2)
+ROWS_BUCKETS = (10, 100, 1000, 10_000, 100_000, 1_000_000, 10_000_000)
+
+# 設定 PROFILE_REQUESTS=1 時每個請求以 cProfile 記錄，結果寫入 PROFILE_DIR
+PROFILE_REQUESTS = os.environ.get('PROFILE_REQUESTS') == '1'
+PROFILE_DIR = os.environ.get('PROFILE_DIR', 'profiles')
+
+_lock = threading.Lock()
+_metrics = {}
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount=1):
+        with _lock:
+            self.value += amount
+
+    def samples(self, name, labels):
+        return [(name, labels, self.value)]
+
+class Gauge(Counter):
+    kind = 'gauge'
+
+    def set(self, value):
+        with _lock:
+            self.value = value
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        with _lock:
+            self.count += 1
+            self.sum += value
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    self.counts[i] += 1
+
+    def samples(self, name, labels):
+        result = [(f'{name}_bucket', labels + (('le', f'{bound:g}'),), count)
+                  for bound, count in zip(self.buckets, self.counts)]
+        result.append((f'{name}_bucket', labels + (('le', '+Inf'),), self.count))
+        result.append((f'{name}_sum', labels, self.sum))
+        result.append((f'{name}_count', labels, self.count))
+        return result
+
+def _get(cls, name, labels, *args):
+    key = (name, tuple(sorted(labels.items())))
+    metric = _metrics.get(key)
+    if metric is None:
+        with _lock:
+            metric = _metrics.setdefault(key, cls(*args))
+    return metric
+
+def counter(name, **labels):
+    return _get(Counter, name, labels)
+
+def gauge(name, **labels):
+    return _get(Gauge, name, labels)
+
+def histogram(name, buckets=DEFAULT_BUCKETS, **labels):
+    return _get(Histogram, name, labels, buckets)
+
+@contextmanager
+def timed(name, **labels):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        histogram(name, **labels).observe(time.perf_counter() - started)
+
+# 函數裝飾器：以函數名稱為標籤記錄執行時間
+def instrumented(name, **labels):
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with timed(name, function=func.__name__, **labels):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in labels)
+    return '{' + ','.join(f'{key}="{value}"' for (key, _), value in zip(labels, escaped)) + '}'
+
+def render():
+    with _lock:
+        items = sorted(_metrics.items(), key=lambda item: item[0])
+        lines, declared = [], set()
+        for (name, labels), metric in items:
+            if name not in declared:
+                lines.append(f'# TYPE {name} {metric.kind}')
+                declared.add(name)
+            for sample_name, sample_labels, value in metric.samples(name, labels):
+                lines.append(f'{sample_name}{_format_labels(sample_labels)} {value:g}')
+    return '\n'.join(lines) + '\n'
+
+def start_profile():
+    if not PROFILE_REQUESTS:
+        return None
+    profile = cProfile.Profile()
+    profile.enable()
+    return profile
+
+def stop_profile(profile, label):
+    if profile is None:
+        return
+    profile.disable()
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    safe_label = ''.join(c if c.isalnum() or c in '-_.' else '_' for c in label)[:80]
+    profile.dump_stats(os.path.join(PROFILE_DIR, f'{time.time():.3f}-{safe_label}.prof'))
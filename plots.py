@@ -1,10 +1,14 @@
 import plotly.graph_objs as go
+import plotly.io as pio
+from plotly.colors import qualitative
 import numpy as np
 from plotly.subplots import make_subplots
-from scipy.fft import fft, fftfreq
 from scipy.interpolate import griddata
 import pandas as pd
 import logging
+from cachetools import LRUCache
+import metrics
+from spectral import welch_psd, spectrogram, SPECTRUM_SEGMENT_LENGTH, SPECTRUM_MAX_BARS
 
 # 設置日誌記錄
 logging.basicConfig(level=logging.INFO)
@@ -20,102 +24,285 @@ colors = {
     'tertiary': '#e74c3c'
 }
 
-def plot_frequency_spectrum(df, x_column, y_column, title, plot_type='bars'):
+# 共用的圖表樣式只定義一次，並取代 plotly 預設樣板：每張圖的 JSON 只夾帶這份精簡的樣板
+pio.templates['dashboard'] = go.layout.Template(layout=dict(
+    plot_bgcolor=colors['background'],
+    paper_bgcolor=colors['background'],
+    font=dict(family="Helvetica, Arial, sans-serif", size=12, color=colors['text']),
+    margin=dict(l=40, r=20, t=40, b=30),
+    hovermode='closest',
+    xaxis=dict(gridcolor=colors['grid']),
+    yaxis=dict(gridcolor=colors['grid']),
+    colorway=qualitative.Plotly
+))
+pio.templates.default = 'dashboard'
+
+# 圖表約略的像素寬度，降採樣後每個像素最多保留一組最小/最大值
+GRAPH_PIXEL_WIDTH = 1200
+DEFAULT_MAX_POINTS = 2 * GRAPH_PIXEL_WIDTH
+
+# 最小/最大值分桶降採樣：每個桶保留極值，尖峰不會被平均掉
+def downsample_minmax(y, max_points):
+    n = len(y)
+    if n <= max_points or max_points < 4:
+        return np.arange(n)
+
+    bucket_size = int(np.ceil(n / (max_points // 2)))
+    n_buckets = int(np.ceil(n / bucket_size))
+    padded = np.full(n_buckets * bucket_size, np.nan)
+    padded[:n] = y
+    buckets = padded.reshape(n_buckets, bucket_size)
+
+    offsets = np.arange(n_buckets) * bucket_size
+    idx_min = offsets + np.nanargmin(buckets, axis=1)
+    idx_max = offsets + np.nanargmax(buckets, axis=1)
+    return np.unique(np.concatenate(([0, n - 1], idx_min, idx_max)))
+
+# Largest-Triangle-Three-Buckets：迴圈只走桶數次，桶內計算以 NumPy 向量化
+def downsample_lttb(x, y, max_points):
+    n = len(y)
+    if n <= max_points or max_points < 3:
+        return np.arange(n)
+
+    edges = np.linspace(1, n - 1, max_points - 1).astype(np.int64)
+    sums_x = np.add.reduceat(x[1:n - 1], edges[:-1] - 1)
+    sums_y = np.add.reduceat(y[1:n - 1], edges[:-1] - 1)
+    counts = np.diff(edges)
+    avg_x = np.append(sums_x / counts, x[-1])
+    avg_y = np.append(sums_y / counts, y[-1])
+
+    selected = np.empty(max_points, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i in range(max_points - 2):
+        lo, hi = edges[i], edges[i + 1]
+        bx, by = x[lo:hi], y[lo:hi]
+        area = np.abs((x[a] - avg_x[i + 1]) * (by - y[a]) - (x[a] - bx) * (avg_y[i + 1] - y[a]))
+        a = lo + int(np.argmax(area))
+        selected[i + 1] = a
+    return selected
+
+# 在建立圖表前降採樣，傳到瀏覽器的點數與資料區間長度無關
+def downsample_series(df, x_column, y_column, max_points=DEFAULT_MAX_POINTS, method='minmax'):
+    valid = df[[x_column, y_column]].dropna()
+    x = valid[x_column].to_numpy()
+    y = valid[y_column].to_numpy(dtype=np.float64)
+
+    if method == 'lttb':
+        x_numeric = x.astype('datetime64[ns]').astype(np.int64).astype(np.float64) if np.issubdtype(x.dtype, np.datetime64) else x.astype(np.float64)
+        idx = downsample_lttb(x_numeric, y, max_points)
+    else:
+        idx = downsample_minmax(y, max_points)
+    return x[idx], y[idx]
+
+# 精簡的陣列格式：數值以 float32、時間以毫秒 epoch 傳送，plotly 會將 NumPy 陣列序列化為 base64 typed array，
+# 不必逐一寫成十進位文字或 ISO 時間字串；時間軸需設定 type='date'
+def compact_values(values):
+    return np.asarray(values, dtype=np.float32)
+
+def compact_times(times):
+    times = np.asarray(times).astype('datetime64[ms]')
+    return times.astype(np.int64).astype(np.float64)
+
+# 載入的數據框已依時間排序，以二分搜尋切出可視區間
+def _slice_x_range(df, x_column, x_range):
+    if x_range is None or df.empty:
+        return df
+    times = df[x_column]
+    lo = times.searchsorted(pd.Timestamp(x_range[0]), side='left')
+    hi = times.searchsorted(pd.Timestamp(x_range[1]), side='right')
+    return df.iloc[lo:hi]
+
+# 頻譜：先重新取樣為均勻取樣率，再以 Welch 法 (或 STFT 時頻圖) 計算，長條數有上限
+@metrics.instrumented('plot_build_seconds')
+# device 與欄位一起作為分段功率譜的緩存鍵，不同設備同一時間的分段不會互相沿用
+def plot_frequency_spectrum(df, x_column, y_column, title, plot_type='bars',
+                            segment_length=SPECTRUM_SEGMENT_LENGTH, max_bars=SPECTRUM_MAX_BARS, device=None):
     if df.empty:
         logger.warning(f"Missing data for frequency spectrum plot: {title}")
         return go.Figure()
 
     try:
-        t = pd.to_datetime(df[x_column])
-        sample_intervals = (t - t.shift()).dt.total_seconds().dropna()
-        mean_interval = sample_intervals.mean()
-        sampling_rate = 1.0 / mean_interval
-        signal = df[y_column].to_numpy()
-        N = len(signal)
-        yf = fft(signal)
-        xf = fftfreq(N, 1 / sampling_rate)
-        
-        mask = xf >= 0
-        xf = xf[mask]
-        yf = yf[mask]
-        amplitude = np.abs(yf) * 2.0 / N
+        if plot_type == 'spectrogram':
+            return _plot_spectrogram(df, x_column, y_column, title, segment_length, max_bars, device)
+
+        result = welch_psd(df[x_column], df[y_column], (device, y_column), segment_length, max_bars)
+        if result is None:
+            logger.warning(f"Insufficient data for frequency spectrum plot: {title}")
+            return go.Figure(layout={'title': f'{title} (Insufficient data)'})
+        xf, power = result
 
         fig = go.Figure()
         if plot_type == 'bars':
             fig.add_trace(go.Bar(
-                x=xf, y=amplitude, 
+                x=compact_values(xf), y=compact_values(power),
                 marker_color=colors['primary'], 
                 marker_line_color=colors['text'], 
                 marker_line_width=1.5
             ))
         else:
             fig.add_trace(go.Scatter(
-                x=xf, y=amplitude, mode='lines',
+                x=compact_values(xf), y=compact_values(power), mode='lines',
                 line=dict(color=colors['primary'], width=2)
             ))
 
         fig.update_layout(
             title=title, 
             xaxis_title='Frequency (Hz)', 
-            yaxis_title='Magnitude',
-            plot_bgcolor=colors['background'],
-            paper_bgcolor=colors['background'],
-            font=dict(family="Helvetica, Arial, sans-serif", size=12, color=colors['text']),
-            margin=dict(l=40, r=20, t=40, b=30),
-            hovermode='closest',
-            xaxis=dict(gridcolor=colors['grid']),
-            yaxis=dict(gridcolor=colors['grid'])
+            yaxis_title='Power Spectral Density'
         )
         return fig
     except Exception as e:
         logger.error(f"Error in plot_frequency_spectrum: {e}")
         return go.Figure(layout={'title': f'{title} (Error occurred)'})
 
-def plot_time_series(df, x_column, y_column, title):
+def _plot_spectrogram(df, x_column, y_column, title, segment_length, max_bins, device=None):
+    result = spectrogram(df[x_column], df[y_column], (device, y_column), segment_length, max_bins)
+    if result is None:
+        logger.warning(f"Insufficient data for spectrogram: {title}")
+        return go.Figure(layout={'title': f'{title} (Insufficient data)'})
+    segment_times, freqs, power = result
+
+    fig = go.Figure(data=[go.Heatmap(x=compact_times(segment_times), y=compact_values(freqs),
+                                     z=compact_values(power.T), colorscale='Viridis')])
+    fig.update_layout(
+        title=title,
+        xaxis=dict(title='Time', type='date'),
+        yaxis_title='Frequency (Hz)'
+    )
+    return fig
+
+# 異常事件標記：放在事件時間之後最近的資料點上，只標記圖表時間範圍內的事件
+def _event_markers(df, x_column, y_column, events):
+    times = df[x_column]
+    event_times = events['RECORDED_TIME']
+    events = events[(event_times >= times.iloc[0]) & (event_times <= times.iloc[-1])]
+    if events.empty:
+        return None
+    index = np.minimum(times.searchsorted(events['RECORDED_TIME']), len(df) - 1)
+    return go.Scattergl(
+        x=compact_times(events['RECORDED_TIME']), y=compact_values(df[y_column].to_numpy()[index]),
+        mode='markers',
+        marker=dict(color=colors['tertiary'], size=10, symbol='x'),
+        text=[f"{rule} {value:.2f}" for rule, value in zip(events['RULE'], events['VALUE'])],
+        hoverinfo='x+text',
+        showlegend=False
+    )
+
+@metrics.instrumented('plot_build_seconds')
+def plot_time_series(df, x_column, y_column, title, max_points=DEFAULT_MAX_POINTS, x_range=None, events=None):
     if df.empty:
         logger.warning(f"Missing data for time series plot: {title}")
         return go.Figure()
     
     try:
+        # 縮放時只取可視區間，再以完整點數預算降採樣，取得更高解析度
+        df = _slice_x_range(df, x_column, x_range)
+        x, y = downsample_series(df, x_column, y_column, max_points)
+
         fig = go.Figure()
+        # 彙總資料附帶每個桶的最小/最大值，以色帶呈現，避免平均值掩蓋尖峰
+        if f'{y_column}_MIN' in df.columns and f'{y_column}_MAX' in df.columns:
+            for suffix, fill in (('_MIN', None), ('_MAX', 'tonexty')):
+                band_x, band_y = downsample_series(df, x_column, y_column + suffix, max_points)
+                fig.add_trace(go.Scattergl(
+                    x=compact_times(band_x), y=compact_values(band_y),
+                    mode='lines',
+                    fill=fill,
+                    fillcolor='rgba(52, 152, 219, 0.2)',
+                    line=dict(width=0),
+                    hoverinfo='skip',
+                    showlegend=False
+                ))
+        # 標記放在主曲線之前：即時推送以 extendData 附加到最後一條 trace
+        if events is not None and not events.empty and not df.empty:
+            markers = _event_markers(df, x_column, y_column, events)
+            if markers is not None:
+                fig.add_trace(markers)
         fig.add_trace(go.Scattergl(
-            x=df[x_column], y=df[y_column], 
+            x=compact_times(x), y=compact_values(y),
             mode='lines+markers',
             marker=dict(color=colors['primary'], size=5, line=dict(width=1)),
             line=dict(color=colors['primary'], width=2)
         ))
         fig.update_layout(
             title=title,
-            xaxis=dict(tickformat='%b %d %Y', gridcolor=colors['grid']),
-            yaxis=dict(title=y_column, gridcolor=colors['grid']),
-            plot_bgcolor=colors['background'],
-            paper_bgcolor=colors['background'],
-            font=dict(family="Helvetica, Arial, sans-serif", size=12, color=colors['text']),
-            margin=dict(l=40, r=20, t=40, b=30),
-            hovermode='closest'
+            xaxis=dict(type='date', tickformat='%b %d %Y'),
+            yaxis=dict(title=y_column),
+            uirevision=y_column
         )
+        if x_range is not None:
+            fig.update_xaxes(range=list(x_range))
         return fig
     except Exception as e:
         logger.error(f"Error in plot_time_series: {e}")
         return go.Figure(layout={'title': f'{title} (Error occurred)'})
 
-def plot_3d_surface(df, x_column, y_column, z_column, title):
+# 3D 曲面的格點數，以及已計算曲面的緩存 (資料未增加時直接沿用)
+SURFACE_GRID_SIZE = 100
+# 曲面的點數預算：區間內原始樣本超過預算時改由彙總表 (1 秒或更粗) 分格，長區間不掃描原始資料
+SURFACE_MAX_POINTS = 100_000
+surface_cache = LRUCache(maxsize=16)
+
+def _grid_axis(values, grid_size):
+    low, high = float(np.nanmin(values)), float(np.nanmax(values))
+    span = high - low if high > low else 1.0
+    axis = np.linspace(low, low + span, grid_size)
+    index = np.rint((values - low) / span * (grid_size - 1)).astype(np.int64)
+    return axis, np.clip(index, 0, grid_size - 1)
+
+# 將資料點分到格點上以 bincount 取平均，成本與資料量呈線性；
+# 只有空的格點才以內插補值，且內插只在縮減後的格點上進行
+def bin_surface(x, y, z, grid_size=SURFACE_GRID_SIZE):
+    valid = ~(np.isnan(x) | np.isnan(y) | np.isnan(z))
+    x, y, z = x[valid], y[valid], z[valid]
+
+    xi, ix = _grid_axis(x, grid_size)
+    yi, iy = _grid_axis(y, grid_size)
+    cells = iy * grid_size + ix
+    sums = np.bincount(cells, weights=z, minlength=grid_size * grid_size)
+    counts = np.bincount(cells, minlength=grid_size * grid_size)
+
+    zi = np.full(grid_size * grid_size, np.nan)
+    filled = counts > 0
+    zi[filled] = sums[filled] / counts[filled]
+
+    xi, yi = np.meshgrid(xi, yi)
+    empty = ~filled
+    if empty.any() and filled.sum() >= 4:
+        try:
+            points = (xi.ravel()[filled], yi.ravel()[filled])
+            zi[empty] = griddata(points, zi[filled], (xi.ravel()[empty], yi.ravel()[empty]), method='linear')
+        except Exception as e:
+            # 格點共線等退化情況無法三角化，保留空格
+            logger.warning(f"Surface interpolation skipped: {e}")
+    return xi, yi, zi.reshape(grid_size, grid_size)
+
+def _surface_cache_key(df, x_column, y_column, z_column, device=None):
+    key = (device, x_column, y_column, z_column, len(df))
+    if 'RECORDED_TIME' in df.columns:
+        key += (df['RECORDED_TIME'].iloc[0], df['RECORDED_TIME'].iloc[-1])
+    return key
+
+@metrics.instrumented('plot_build_seconds')
+def plot_3d_surface(df, x_column, y_column, z_column, title, device=None):
     if df.empty or df.shape[0] < 4:
         logger.warning(f"Insufficient data for 3D surface plot: {title}")
         return go.Figure(layout={'title': f'{title} (Insufficient data)'})
 
     try:
-        x = df[x_column].values
-        y = df[y_column].values
-        z = df[z_column].values
+        key = _surface_cache_key(df, x_column, y_column, z_column, device)
+        surface = surface_cache.get(key)
+        if surface is None:
+            surface = bin_surface(df[x_column].to_numpy(dtype=np.float64),
+                                  df[y_column].to_numpy(dtype=np.float64),
+                                  df[z_column].to_numpy(dtype=np.float64))
+            surface_cache[key] = surface
+        xi, yi, zi = surface
 
-        xi = np.linspace(min(x), max(x), 100)
-        yi = np.linspace(min(y), max(y), 100)
-        xi, yi = np.meshgrid(xi, yi)
-
-        zi = griddata((x, y), z, (xi, yi), method='cubic')
-
-        fig = go.Figure(data=[go.Surface(x=xi, y=yi, z=zi, colorscale='Viridis')])
+        # 格點是規則網格，x / y 只需傳送一維座標軸
+        fig = go.Figure(data=[go.Surface(x=compact_values(xi[0]), y=compact_values(yi[:, 0]),
+                                         z=compact_values(zi), colorscale='Viridis')])
         fig.update_layout(
             title=title,
             scene=dict(
@@ -123,19 +310,96 @@ def plot_3d_surface(df, x_column, y_column, z_column, title):
                 yaxis_title=y_column,
                 zaxis_title=z_column,
                 bgcolor=colors['background']
-            ),
-            plot_bgcolor=colors['background'],
-            paper_bgcolor=colors['background'],
-            font=dict(family="Helvetica, Arial, sans-serif", size=12, color=colors['text']),
-            margin=dict(l=40, r=20, t=40, b=30),
-            hovermode='closest'
+            )
         )
         return fig
     except Exception as e:
         logger.error(f"Error in plot_3d_surface: {e}")
         return go.Figure(layout={'title': f'{title} (Error occurred)'})
 
-def create_combined_plot(df, x_column, y_columns, title):
+# 週比較的共同時間軸：各週依「距週一 00:00 的時間」對齊到同一個參考週
+WEEK_REFERENCE_START = pd.Timestamp('2024-01-01')  # 週一
+
+def align_to_week(times, week_starts):
+    times = np.asarray(times).astype('datetime64[ns]')
+    starts = pd.DatetimeIndex(sorted(week_starts)).to_numpy(dtype='datetime64[ns]')
+    index = np.maximum(starts.searchsorted(times, side='right') - 1, 0)
+    offsets = times - starts[index]
+    return index, WEEK_REFERENCE_START.to_datetime64() + offsets
+
+# 將所選各週疊加在同一張圖上，每週一條降採樣後的曲線
+@metrics.instrumented('plot_build_seconds')
+def plot_week_comparison(df, x_column, y_column, week_starts, title, max_points=DEFAULT_MAX_POINTS):
+    if df.empty or not week_starts:
+        logger.warning(f"Missing data for week comparison plot: {title}")
+        return go.Figure()
+
+    try:
+        week_starts = sorted(pd.Timestamp(week) for week in week_starts)
+        index, aligned = align_to_week(df[x_column], week_starts)
+        palette = qualitative.Plotly
+        fig = go.Figure()
+        for i, week in enumerate(week_starts):
+            mask = index == i
+            if not mask.any():
+                continue
+            week_df = pd.DataFrame({x_column: aligned[mask], y_column: df[y_column].to_numpy()[mask]})
+            x, y = downsample_series(week_df, x_column, y_column, max_points)
+            fig.add_trace(go.Scattergl(
+                x=compact_times(x), y=compact_values(y),
+                mode='lines',
+                name=f'Week of {week:%Y-%m-%d}',
+                line=dict(color=palette[i % len(palette)], width=1.5)
+            ))
+
+        fig.update_layout(
+            title=title,
+            xaxis=dict(title='Time of Week', type='date', tickformat='%a %H:%M', showgrid=True,
+                       range=[WEEK_REFERENCE_START, WEEK_REFERENCE_START + pd.Timedelta(days=7)]),
+            yaxis=dict(title=y_column, showgrid=True),
+            hovermode='x unified',
+            legend=dict(orientation='h')
+        )
+        return fig
+    except Exception as e:
+        logger.error(f"Error in plot_week_comparison: {e}")
+        return go.Figure(layout={'title': f'{title} (Error occurred)'})
+
+# 設備總覽：每台設備各軸的振動 RMS 並排比較，懸停顯示標準差與極值
+@metrics.instrumented('plot_build_seconds')
+def plot_fleet_overview(summary, device_column, axes, title):
+    if summary.empty:
+        logger.warning(f"Missing data for fleet overview plot: {title}")
+        return go.Figure()
+
+    try:
+        devices = summary[device_column].astype(str).tolist()
+        palette = qualitative.Plotly
+        fig = go.Figure()
+        for i, axis in enumerate(axes):
+            fig.add_trace(go.Bar(
+                x=devices, y=compact_values(summary[f'{axis}_RMS']),
+                name=axis,
+                marker=dict(color=palette[i % len(palette)]),
+                customdata=np.column_stack([summary[f'{axis}_STD'], summary[f'{axis}_MIN'], summary[f'{axis}_MAX']]),
+                hovertemplate=(f'{axis} RMS %{{y:.3f}}<br>STD %{{customdata[0]:.3f}}'
+                               '<br>Min %{customdata[1]:.3f} / Max %{customdata[2]:.3f}<extra>%{x}</extra>')
+            ))
+
+        fig.update_layout(
+            title=title,
+            barmode='group',
+            xaxis=dict(title='Device', type='category'),
+            yaxis=dict(title='RMS', showgrid=True),
+            legend=dict(orientation='h')
+        )
+        return fig
+    except Exception as e:
+        logger.error(f"Error in plot_fleet_overview: {e}")
+        return go.Figure(layout={'title': f'{title} (Error occurred)'})
+
+@metrics.instrumented('plot_build_seconds')
+def create_combined_plot(df, x_column, y_columns, title, max_points=DEFAULT_MAX_POINTS):
     if df.empty:
         logger.warning(f"Missing data for combined plot: {title}")
         return go.Figure()
@@ -143,22 +407,19 @@ def create_combined_plot(df, x_column, y_columns, title):
     try:
         fig = make_subplots(rows=len(y_columns), cols=1, shared_xaxes=True, subplot_titles=y_columns)
         for i, y_column in enumerate(y_columns, 1):
+            x, y = downsample_series(df, x_column, y_column, max_points)
             fig.add_trace(go.Scatter(
-                x=df[x_column], y=df[y_column], 
+                x=compact_times(x), y=compact_values(y),
                 mode='lines+markers', 
                 name=y_column,
                 marker=dict(color=colors['primary'], size=5, line=dict(width=1)),
                 line=dict(color=colors['primary'], width=2)
             ), row=i, col=1)
 
+        fig.update_xaxes(type='date')
         fig.update_layout(
             title_text=title, 
-            showlegend=False,
-            plot_bgcolor=colors['background'],
-            paper_bgcolor=colors['background'],
-            font=dict(family="Helvetica, Arial, sans-serif", size=12, color=colors['text']),
-            margin=dict(l=40, r=20, t=40, b=30),
-            hovermode='closest'
+            showlegend=False
         )
         return fig
     except Exception as e:
@@ -0,0 +1,166 @@
+import os
+import time
+import hashlib
+import logging
+import threading
+from contextlib import contextmanager
+
+import metrics
+
+try:
+    import fcntl
+except ImportError:  # Windows 沒有 flock，只支援單一行程執行，鎖一律視為取得
+    fcntl = None
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc  # noqa: F401
+except ImportError:  # 共用緩存以 Arrow IPC 檔案保存，缺少 pyarrow 時停用
+    pa = None
+
+# 多行程部署 (gunicorn) 時各工作行程共用的狀態：跨行程檔案鎖，以及以檔案保存的數據框緩存
+
+logger = logging.getLogger(__name__)
+
+SHARED_DIR = os.environ.get('SHARED_DIR', 'shared')
+# 設定 SHARED_CACHE=1 時啟用共用緩存 (gunicorn.conf.py 預設開啟)；單一行程時本地緩存已足夠
+SHARED_CACHE_ENABLED = os.environ.get('SHARED_CACHE') == '1'
+SHARED_CACHE_MAX_BYTES = 2 * 1024 ** 3
+SHARED_CACHE_TTL_SECONDS = 600
+
+# 以 flock 實作的跨行程鎖，每次取得時開啟新的檔案描述符，同一行程的不同執行緒之間也會互斥。
+# shared=True 為讀取鎖，可與其他讀取鎖並存
+class FileLock:
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+
+    def acquire(self, shared=False, blocking=True):
+        if fcntl is None:
+            return True
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        flags = (fcntl.LOCK_SH if shared else fcntl.LOCK_EX) | (0 if blocking else fcntl.LOCK_NB)
+        try:
+            fcntl.flock(fd, flags)
+        except BlockingIOError:
+            os.close(fd)
+            return False
+        self._local.__dict__.setdefault('fds', []).append(fd)
+        return True
+
+    def release(self):
+        if fcntl is None:
+            return
+        fd = self._local.fds.pop()
+        fcntl.flock(fd, fcntl.LOCK_UN)
+        os.close(fd)
+
+    @contextmanager
+    def hold(self, shared=False):
+        self.acquire(shared)
+        try:
+            yield
+        finally:
+            self.release()
+
+def lock_path(name):
+    return os.path.join(SHARED_DIR, 'locks', f'{name}.lock')
+
+# 以檔案修改時間記錄跨行程共用的「上次執行時間」
+def seconds_since(name):
+    try:
+        return time.time() - os.path.getmtime(lock_path(name) + '.stamp')
+    except OSError:
+        return float('inf')
+
+def touch(name):
+    path = lock_path(name) + '.stamp'
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'a'):
+        os.utime(path)
+
+# 數據框緩存的跨行程層：每個項目一個 Arrow IPC 檔案，讀取時以記憶體映射載入。
+# 只在從資料庫完整載入後寫入，之後各行程各自追加尾端新資料，不會每次刷新都重寫檔案。
+# 存活時間從寫入起算，讀取不延長：過期後由下一次完整載入重寫，接手的行程需要補上的尾端資料因此有上限
+class SharedFrameCache:
+    def __init__(self, root=os.path.join(SHARED_DIR, 'frames'), max_bytes=SHARED_CACHE_MAX_BYTES,
+                 ttl=SHARED_CACHE_TTL_SECONDS, enabled=SHARED_CACHE_ENABLED):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._enabled = enabled
+        self._lock = FileLock(os.path.join(root, '.lock'))
+
+    def enabled(self):
+        return self._enabled and pa is not None
+
+    def _path(self, key):
+        return os.path.join(self.root, hashlib.sha1(repr(key).encode()).hexdigest() + '.arrow')
+
+    # 不存在或已過期時返回 None
+    def get(self, key):
+        if not self.enabled():
+            return None
+        path = self._path(key)
+        try:
+            with self._lock.hold(shared=True):
+                if time.time() - os.path.getmtime(path) > self.ttl:
+                    metrics.counter('shared_cache_misses_total').inc()
+                    return None
+                with pa.memory_map(path, 'r') as source:
+                    table = pa.ipc.open_file(source).read_all()
+        except FileNotFoundError:
+            metrics.counter('shared_cache_misses_total').inc()
+            return None
+        except Exception as e:
+            logger.error(f"Error reading shared cache entry {path}: {e}")
+            return None
+        metrics.counter('shared_cache_hits_total').inc()
+        return table.to_pandas(split_blocks=True)
+
+    def put(self, key, df):
+        if not self.enabled() or df.empty:
+            return
+        path = self._path(key)
+        try:
+            os.makedirs(self.root, exist_ok=True)
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            tmp = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+            with pa.OSFile(tmp, 'wb') as sink:
+                with pa.ipc.new_file(sink, table.schema) as writer:
+                    writer.write_table(table)
+            os.replace(tmp, path)
+            self._prune()
+        except Exception as e:
+            logger.error(f"Error writing shared cache entry {path}: {e}")
+
+    # 刪除過期項目，總大小超過預算時從最早寫入的項目開始刪除
+    def _prune(self):
+        with self._lock.hold():
+            entries = []
+            for name in os.listdir(self.root):
+                if not name.endswith('.arrow'):
+                    continue
+                path = os.path.join(self.root, name)
+                stat = os.stat(path)
+                if time.time() - stat.st_mtime > self.ttl:
+                    os.remove(path)
+                else:
+                    entries.append((stat.st_mtime, stat.st_size, path))
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                os.remove(path)
+                total -= size
+
+    def clear(self):
+        if not os.path.isdir(self.root):
+            return
+        with self._lock.hold():
+            for name in os.listdir(self.root):
+                if name.endswith('.arrow'):
+                    os.remove(os.path.join(self.root, name))
+
+shared_frames = SharedFrameCache()
@@ -0,0 +1,142 @@
+import numpy as np
+from cachetools import LRUCache
+from scipy.signal import get_window
+
+# 頻譜分析設定：每段的樣本數、輸出的最大長條數與時頻圖的最大時間欄數
+SPECTRUM_SEGMENT_LENGTH = 256
+SPECTRUM_MAX_BARS = 128
+SPECTROGRAM_MAX_COLUMNS = 200
+SPECTRUM_MIN_SEGMENT_LENGTH = 8
+GAP_FACTOR = 3  # 取樣間隔超過中位數的倍數即視為資料中斷，不跨越中斷內插
+
+# 每一段的功率譜只計算一次；分段對齊絕對時間格點，新的刷新只需轉換新增的分段。
+# 緩存鍵的 cache_key 須能區分資料來源 (設備與欄位)，同一時間格點上不同設備的分段才不會混用
+segment_cache = LRUCache(maxsize=50000)
+
+# 以取樣間隔的中位數估計取樣率，四捨五入到三位有效數字，讓分段格點在每次刷新時保持一致
+def estimate_sampling_rate(times_ns):
+    diffs = np.diff(times_ns)
+    diffs = diffs[diffs > 0]
+    if diffs.size == 0:
+        return None
+    fs = 1e9 / np.median(diffs)
+    return float(f'{fs:.3g}')
+
+# 依中斷切成連續區段，每段線性內插到均勻格點；格點索引以 epoch 起算
+def resample_uniform(times_ns, values, fs):
+    step_ns = int(round(1e9 / fs))
+    breaks = np.flatnonzero(np.diff(times_ns) > GAP_FACTOR * step_ns) + 1
+    runs = []
+    for run_times, run_values in zip(np.split(times_ns, breaks), np.split(values, breaks)):
+        first = -(-run_times[0] // step_ns)
+        last = run_times[-1] // step_ns
+        if last < first:
+            continue
+        grid = np.arange(first, last + 1, dtype=np.int64)
+        runs.append((first, np.interp(grid * step_ns, run_times, run_values)))
+    return runs
+
+# 取出各區段內完整的分段，分段編號 = 格點索引 // 分段長度
+def _aligned_segments(runs, nperseg):
+    ids, segments = [], []
+    for first, samples in runs:
+        start = -(-first // nperseg) * nperseg
+        count = (first + len(samples) - start) // nperseg
+        if count <= 0:
+            continue
+        offset = start - first
+        block = samples[offset:offset + count * nperseg].reshape(count, nperseg)
+        ids.append(start // nperseg + np.arange(count))
+        segments.append(block)
+    if not ids:
+        return np.empty(0, dtype=np.int64), np.empty((0, nperseg))
+    return np.concatenate(ids), np.vstack(segments)
+
+# 只對未緩存的分段做加窗 FFT，所有新分段一次以矩陣運算完成
+def _segment_psd(cache_key, fs, nperseg, ids, segments):
+    keys = [(cache_key, fs, nperseg, int(segment_id)) for segment_id in ids]
+    rows = [segment_cache.get(key) for key in keys]
+    missing = [i for i, row in enumerate(rows) if row is None]
+
+    if missing:
+        window = get_window('hann', nperseg)
+        scale = 1.0 / (fs * np.sum(window ** 2))
+        block = segments[missing]
+        block = block - block.mean(axis=1, keepdims=True)
+        psd = np.abs(np.fft.rfft(block * window, axis=1)) ** 2 * scale
+        psd[:, 1:-1 if nperseg % 2 == 0 else None] *= 2
+        for i, row in zip(missing, psd):
+            segment_cache[keys[i]] = row
+            rows[i] = row
+
+    return np.vstack(rows)
+
+# 將頻率軸分成不超過 max_bins 組並取平均，輸出大小與資料量無關
+def _bin_frequencies(freqs, psd, max_bins):
+    if len(freqs) <= max_bins:
+        return freqs, psd
+    edges = np.linspace(0, len(freqs), max_bins + 1).astype(np.int64)
+    counts = np.diff(edges)
+    binned_freqs = np.add.reduceat(freqs, edges[:-1]) / counts
+    binned_psd = np.add.reduceat(psd, edges[:-1], axis=-1) / counts
+    return binned_freqs, binned_psd
+
+def _prepare(times, values, segment_length):
+    times_ns = np.asarray(times).astype('datetime64[ns]').view(np.int64)
+    values = np.asarray(values, dtype=np.float64)
+    valid = ~np.isnan(values)
+    times_ns, values = times_ns[valid], values[valid]
+    if len(values) < SPECTRUM_MIN_SEGMENT_LENGTH:
+        return None
+
+    # 載入的資料已排序，只有未排序的輸入才需要排序
+    if np.any(np.diff(times_ns) < 0):
+        order = np.argsort(times_ns, kind='stable')
+        times_ns, values = times_ns[order], values[order]
+    fs = estimate_sampling_rate(times_ns)
+    if fs is None:
+        return None
+
+    runs = resample_uniform(times_ns, values, fs)
+    longest = max((len(samples) for _, samples in runs), default=0)
+    if longest < SPECTRUM_MIN_SEGMENT_LENGTH:
+        return None
+    # 資料太短時縮小分段長度 (取 2 的次方)，仍能給出頻譜
+    nperseg = min(segment_length, 2 ** int(np.log2(longest)))
+    return fs, nperseg, runs
+
+# Welch 功率譜密度：對齊分段的加窗週期圖取平均
+def welch_psd(times, values, cache_key, segment_length=SPECTRUM_SEGMENT_LENGTH, max_bins=SPECTRUM_MAX_BARS):
+    prepared = _prepare(times, values, segment_length)
+    if prepared is None:
+        return None
+    fs, nperseg, runs = prepared
+    ids, segments = _aligned_segments(runs, nperseg)
+    if len(ids) == 0:
+        return None
+
+    psd = _segment_psd(cache_key, fs, nperseg, ids, segments).mean(axis=0)
+    freqs = np.fft.rfftfreq(nperseg, 1.0 / fs)
+    return _bin_frequencies(freqs, psd, max_bins)
+
+# 時頻圖 (STFT)：每段一欄，時間欄數超過上限時合併相鄰分段
+def spectrogram(times, values, cache_key, segment_length=SPECTRUM_SEGMENT_LENGTH,
+                max_bins=SPECTRUM_MAX_BARS, max_columns=SPECTROGRAM_MAX_COLUMNS):
+    prepared = _prepare(times, values, segment_length)
+    if prepared is None:
+        return None
+    fs, nperseg, runs = prepared
+    ids, segments = _aligned_segments(runs, nperseg)
+    if len(ids) == 0:
+        return None
+
+    psd = _segment_psd(cache_key, fs, nperseg, ids, segments)
+    step_ns = int(round(1e9 / fs))
+    segment_times = (ids * nperseg * step_ns).astype('datetime64[ns]')
+    if len(ids) > max_columns:
+        edges = np.linspace(0, len(ids), max_columns + 1).astype(np.int64)
+        psd = np.add.reduceat(psd, edges[:-1], axis=0) / np.diff(edges)[:, None]
+        segment_times = segment_times[edges[:-1]]
+
+    freqs, psd = _bin_frequencies(np.fft.rfftfreq(nperseg, 1.0 / fs), psd, max_bins)
+    return segment_times, freqs, psd
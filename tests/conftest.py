@@ -0,0 +1,41 @@
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+# 模組位於專案根目錄 (非套件)，測試以根目錄為匯入路徑
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import data
+from benchmark import generate_accelerometer
+
+# 切分成多批時，逐批處理的結果須與一次處理相同
+def process_in_batches(engine, df, batch_rows):
+    events = []
+    for start in range(0, len(df), batch_rows):
+        events += engine.process(df.iloc[start:start + batch_rows])
+    return events
+
+@pytest.fixture
+def accelerometer():
+    return generate_accelerometer(20_000)
+
+# 以基準測試使用的 SQLite 替身資料庫測試資料層；熱儲存指向暫存目錄，測試結束後還原原本的資料庫。
+# 返回的函數將資料列寫入指定的資料表
+@pytest.fixture
+def sqlite_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(data, 'db_engine', data.db_engine)
+    monkeypatch.setattr(data.hot_store, 'root', str(tmp_path / 'hot_store'))
+    url = f"sqlite:///{tmp_path / 'test.db'}"
+    engine = data.create_db_engine(url)
+    empty = pd.DataFrame({'RECORDED_TIME': pd.Series(dtype='datetime64[us]'),
+                          **{axis: pd.Series(dtype=float) for axis in data.ROLLUP_AXES}})
+    empty.to_sql('AccelerometerData', engine, index=False)
+    engine.dispose()
+    data.configure_engine(url)
+
+    def write(df, table_name='AccelerometerData'):
+        df.to_sql(table_name, data.db_engine, if_exists='append', index=False)
+
+    return write
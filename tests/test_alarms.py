@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+
+from alarms import AlarmEngine
+from conftest import process_in_batches
+
+# 在模擬資料上加入 X 軸的緩慢偏移 (RATE) 與 Y 軸的振動突增 (RMS)，Z 軸帶重力已會超過範圍 (RANGE)
+@pytest.fixture
+def faulty(accelerometer):
+    df = accelerometer.copy()
+    t = np.arange(len(df)) / 100.0
+    ramp = (t >= 50) & (t < 60)
+    df.loc[ramp, 'XOUT'] += 8.0 * (t[ramp] - 50)
+    df.loc[t >= 60, 'XOUT'] += 80.0
+    burst = (t >= 120) & (t < 130)
+    df.loc[burst, 'YOUT'] += 6.0 * np.sin(2 * np.pi * 20.0 * t[burst])
+    return df
+
+def _assert_same_events(chunked, single):
+    assert [(e['RECORDED_TIME'], e['AXIS'], e['RULE'], e['STATE']) for e in chunked] == \
+        [(e['RECORDED_TIME'], e['AXIS'], e['RULE'], e['STATE']) for e in single]
+    np.testing.assert_allclose([e['VALUE'] for e in chunked], [e['VALUE'] for e in single], rtol=1e-9)
+
+def test_faults_raise_every_rule(faulty):
+    events = AlarmEngine().process(faulty)
+    raised = {(event['AXIS'], event['RULE']) for event in events if event['STATE'] == 'RAISED'}
+    assert {('XOUT', 'RATE'), ('YOUT', 'RMS'), ('ZOUT', 'RANGE')} <= raised
+
+@pytest.mark.parametrize('batch_rows', [7, 100, 4999])
+def test_chunked_matches_single_batch(faulty, batch_rows):
+    single = AlarmEngine().process(faulty)
+    chunked = process_in_batches(AlarmEngine(), faulty, batch_rows)
+    assert {event['RULE'] for event in single} == {'RANGE', 'RATE', 'RMS'}
+    _assert_same_events(chunked, single)
+
+# 逐列處理：變化率與 RMS 視窗完全由上一批留下的尾端資料組成
+def test_single_row_batches_match_single_batch(faulty):
+    df = faulty.iloc[4800:6300]
+    single = AlarmEngine().process(df)
+    assert {event['RULE'] for event in single} >= {'RATE'}
+    _assert_same_events(process_in_batches(AlarmEngine(), df, 1), single)
+
+# 已處理過的資料列 (浮水印之前) 重複送入時不再產生事件
+def test_rows_before_watermark_are_ignored(faulty):
+    engine = AlarmEngine()
+    assert engine.process(faulty)
+    assert engine.process(faulty) == []
+    assert engine.watermark == faulty['RECORDED_TIME'].iloc[-1]
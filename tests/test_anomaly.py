@@ -0,0 +1,53 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from anomaly import AnomalyEngine, ANOMALY_SOURCES
+from conftest import process_in_batches
+
+def _event_keys(events):
+    return [(e['RECORDED_TIME'], e['AXIS'], e['RULE'], e['STATE']) for e in events]
+
+# 原始資料：X 軸在 100 秒處突然偏移，觸發 z 分數並累積成 EWMA 與 CUSUM 的漂移
+@pytest.fixture
+def shifted(accelerometer):
+    df = accelerometer.copy()
+    df.loc[10_000:, 'XOUT'] += 5.0
+    return df
+
+# StatisticsData：每 10 秒一列的特徵，STD_X 在第 1000 列之後緩慢上升 (軸承磨損)，峰值頻率在第 1500 列跳動
+@pytest.fixture
+def statistics():
+    rng = np.random.default_rng(1)
+    n = 2000
+    df = pd.DataFrame({'RECORDED_TIME': pd.Timestamp('2024-01-01') + pd.to_timedelta(np.arange(n) * 10, unit='s')})
+    for column in ANOMALY_SOURCES['StatisticsData'][0]:
+        base = 12.0 if column.startswith('PEAK_FREQ') else 1.0
+        df[column] = base + rng.normal(0, 0.05 * base, n)
+    df['STD_X'] += np.clip(np.arange(n) - 1000, 0, None) * 0.002
+    df.loc[1500:, 'PEAK_FREQ_Y'] = 20.0
+    return df
+
+@pytest.mark.parametrize('batch_rows', [37, 100, 4999])
+def test_raw_chunked_matches_single_batch(shifted, batch_rows):
+    single = AnomalyEngine('AccelerometerData').process(shifted)
+    chunked = process_in_batches(AnomalyEngine('AccelerometerData'), shifted, batch_rows)
+    assert {(e['AXIS'], e['RULE']) for e in single if e['STATE'] == 'RAISED'} >= {
+        ('XOUT', 'ZSCORE'), ('XOUT', 'EWMA'), ('XOUT', 'CUSUM')}
+    assert _event_keys(chunked) == _event_keys(single)
+    np.testing.assert_allclose([e['VALUE'] for e in chunked], [e['VALUE'] for e in single], rtol=1e-6)
+
+@pytest.mark.parametrize('batch_rows', [1, 3, 250])
+def test_statistics_chunked_matches_single_batch(statistics, batch_rows):
+    single = AnomalyEngine('StatisticsData').process(statistics)
+    chunked = process_in_batches(AnomalyEngine('StatisticsData'), statistics, batch_rows)
+    raised = {(e['AXIS'], e['RULE']) for e in single if e['STATE'] == 'RAISED'}
+    assert ('STD_X', 'CUSUM') in raised and ('PEAK_FREQ_Y', 'ZSCORE') in raised
+    assert _event_keys(chunked) == _event_keys(single)
+    np.testing.assert_allclose([e['VALUE'] for e in chunked], [e['VALUE'] for e in single], rtol=1e-6)
+
+# 平穩資料不應觸發漂移規則
+def test_stationary_statistics_do_not_drift(statistics):
+    stationary = statistics.iloc[:1000]
+    events = AnomalyEngine('StatisticsData').process(stationary)
+    assert not [e for e in events if e['RULE'] in ('EWMA', 'CUSUM')]
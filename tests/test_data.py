@@ -0,0 +1,88 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import data
+
+START = pd.Timestamp('2024-01-01')
+COLUMNS = ['RECORDED_TIME', 'XOUT', 'YOUT', 'ZOUT']
+
+def _rows(offsets_ms, value=0.0):
+    n = len(offsets_ms)
+    return pd.DataFrame({'RECORDED_TIME': START + pd.to_timedelta(np.asarray(offsets_ms), unit='ms'),
+                         'XOUT': value + np.arange(n, dtype=float), 'YOUT': np.full(n, value), 'ZOUT': np.zeros(n)})
+
+# 同一時間戳的資料列順序不固定，比較前依時間與數值排序
+def _canonical(df):
+    df = df[COLUMNS].astype({'RECORDED_TIME': 'datetime64[us]', 'XOUT': float, 'YOUT': float, 'ZOUT': float})
+    return df.sort_values(COLUMNS, ignore_index=True)
+
+def _assert_matches_database(df):
+    expected = data._query_database('AccelerometerData', COLUMNS, START, START + pd.Timedelta(days=1))
+    pd.testing.assert_frame_equal(_canonical(df), _canonical(expected))
+
+def _get(store):
+    return store.get('AccelerometerData', '2024-01-01', '2024-01-01', COLUMNS)
+
+def test_tail_append_reuses_the_buffer(sqlite_db):
+    sqlite_db(_rows(range(0, 100, 10)))
+    store = data.IncrementalStore()
+    first = _get(store)
+    buffer = store.cache.items()[0][1]['buffer']
+
+    sqlite_db(_rows(range(100, 150, 10), value=100.0))
+    second = _get(store)
+    assert len(first) == 10  # 已返回的數據框不受追加影響
+    assert len(second) == 15
+    assert store.cache.items()[0][1]['buffer'] is buffer
+    _assert_matches_database(second)
+
+# 與浮水印同一時間戳後到的資料列 (同時間戳的多筆樣本) 不能遺漏，也不能重複
+def test_late_rows_at_the_watermark(sqlite_db):
+    sqlite_db(_rows(range(0, 100, 10)))
+    store = data.IncrementalStore()
+    _get(store)
+
+    sqlite_db(_rows([90, 90, 100], value=50.0))
+    df = _get(store)
+    assert len(df) == 13
+    assert (df['RECORDED_TIME'] == START + pd.Timedelta(milliseconds=90)).sum() == 3
+    assert df['RECORDED_TIME'].is_monotonic_increasing
+    _assert_matches_database(df)
+
+    # 沒有新資料時不改變結果
+    pd.testing.assert_frame_equal(_get(store), df)
+
+# 浮水印當下的資料列被改寫時 (例如彙總表最後一個桶) 改以新的資料重建
+def test_rewritten_watermark_row(sqlite_db):
+    sqlite_db(_rows(range(0, 100, 10)))
+    store = data.IncrementalStore()
+    _get(store)
+
+    with data.db_engine.begin() as connection:
+        connection.exec_driver_sql("UPDATE AccelerometerData SET XOUT = -1 WHERE XOUT = 9")
+    sqlite_db(_rows([100], value=100.0))
+    df = _get(store)
+    assert len(df) == 11 and df['XOUT'].iloc[9] == -1
+    _assert_matches_database(df)
+
+def _export(chunk_rows):
+    return list(data.iter_range_chunks('AccelerometerData', '2024-01-01', '2024-01-01', chunk_rows=chunk_rows))
+
+# 鍵集分頁：頁尾時間戳的資料列被 LIMIT 截斷時，以等值查詢補齊，每一列只輸出一次
+@pytest.mark.parametrize('chunk_rows', [2, 3, 4, 100])
+def test_range_chunks_keep_ties_together(sqlite_db, chunk_rows):
+    sqlite_db(_rows([0, 10, 10, 10, 10, 20, 30, 30, 40, 50, 50, 50]))
+    chunks = _export(chunk_rows)
+    df = pd.concat(chunks, ignore_index=True)
+    assert len(df) == 12
+    _assert_matches_database(df)
+    # 同一時間戳的資料列全部在同一個資料塊中
+    times = [set(chunk['RECORDED_TIME']) for chunk in chunks]
+    assert all(not (a & b) for i, a in enumerate(times) for b in times[i + 1:])
+
+def test_range_chunks_of_an_empty_range(sqlite_db):
+    chunks = _export(100)
+    assert len(chunks) == 1 and chunks[0].empty
+    assert list(chunks[0].columns) == COLUMNS
+    assert chunks[0]['RECORDED_TIME'].dtype == 'datetime64[us]' and chunks[0]['XOUT'].dtype == np.float32
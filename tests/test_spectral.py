@@ -0,0 +1,52 @@
+import numpy as np
+import pandas as pd
+import pytest
+from scipy.signal import welch
+
+from spectral import segment_cache, spectrogram, welch_psd
+
+FS = 100.0
+NPERSEG = 256
+
+@pytest.fixture(autouse=True)
+def clear_segment_cache():
+    segment_cache.clear()
+
+# 起點對齊分段格點、長度為分段的整數倍，自訂的分段與 scipy 的不重疊分段完全一致
+def _aligned_signal(segments, seed=0):
+    rng = np.random.default_rng(seed)
+    n = segments * NPERSEG
+    start = pd.Timestamp('2024-01-01').value // (NPERSEG * 10_000_000) * (NPERSEG * 10_000_000)
+    times = (start + np.arange(n) * 10_000_000).astype('datetime64[ns]')
+    t = np.arange(n) / FS
+    values = 0.8 * np.sin(2 * np.pi * 12.0 * t) + 0.3 * np.sin(2 * np.pi * 37.0 * t) + rng.normal(0, 0.2, n)
+    return times, values
+
+def test_psd_matches_scipy_welch():
+    times, values = _aligned_signal(40)
+    freqs, psd = welch_psd(times, values, 'x', max_bins=NPERSEG)
+    expected_freqs, expected_psd = welch(values, FS, window='hann', nperseg=NPERSEG, noverlap=0, detrend='constant')
+    np.testing.assert_allclose(freqs, expected_freqs)
+    np.testing.assert_allclose(psd, expected_psd, rtol=1e-10, atol=1e-15)
+
+# 新增資料後只計算新的分段，結果仍與對全部資料執行 scipy 相同
+def test_incremental_psd_matches_scipy_welch():
+    times, values = _aligned_signal(40)
+    welch_psd(times[:20 * NPERSEG], values[:20 * NPERSEG], 'x', max_bins=NPERSEG)
+    cached = len(segment_cache)
+    _, psd = welch_psd(times, values, 'x', max_bins=NPERSEG)
+    assert cached == 20 and len(segment_cache) == 40
+    np.testing.assert_allclose(psd, welch(values, FS, window='hann', nperseg=NPERSEG, noverlap=0)[1], rtol=1e-10)
+
+def test_peak_frequencies():
+    times, values = _aligned_signal(40)
+    freqs, psd = welch_psd(times, values, 'x', max_bins=NPERSEG)
+    assert abs(freqs[np.argmax(psd)] - 12.0) < FS / NPERSEG
+
+# 時頻圖每一欄為一個分段的週期圖，平均後即為 Welch 功率譜
+def test_spectrogram_columns_average_to_welch():
+    times, values = _aligned_signal(40)
+    segment_times, _, psd = spectrogram(times, values, 'x', max_bins=NPERSEG, max_columns=100)
+    assert psd.shape == (40, NPERSEG // 2 + 1)
+    assert segment_times[0] == times[0] and segment_times[1] == times[NPERSEG]
+    np.testing.assert_allclose(psd.mean(axis=0), welch_psd(times, values, 'x', max_bins=NPERSEG)[1], rtol=1e-10)
@@ -0,0 +1,185 @@
+import os
+import threading
+import logging
+
+import numpy as np
+import pandas as pd
+
+from data import (fetch_max_time, fetch_min_time, fetch_rows_after, query_range, append_rows, refresh_rollups,
+                  hot_store, has_devices, add_device_column, ensure_time_indexes, fetch_devices, store_alarm_events,
+                  TABLE_COLUMNS, ROLLUP_AXES, DEVICE_COLUMN)
+from alarms import AlarmEngine, fetch_new_rows
+from anomaly import AnomalyEngine
+from shared import FileLock, lock_path
+
+# 設置日誌記錄
+logger = logging.getLogger(__name__)
+
+STATS_WINDOW_SECONDS = 10         # 每列 StatisticsData 涵蓋的時間長度
+STATS_SAMPLES_PER_WINDOW = 256    # 計算峰值頻率前，每個視窗重新取樣的點數
+STATS_MIN_SAMPLES = 16            # 樣本數不足的視窗不計算
+STATS_MAX_WINDOWS_PER_BATCH = 2000
+WORKER_INTERVAL_SECONDS = 10
+
+FEATURE_AXES = {'XOUT': 'X', 'YOUT': 'Y', 'ZOUT': 'Z'}
+
+# 一次計算所有完整視窗的特徵：MSE 為視窗內的均方值，STD 為標準差，峰值頻率取自重新取樣後的 FFT
+def compute_window_features(df, window_seconds=STATS_WINDOW_SECONDS, samples=STATS_SAMPLES_PER_WINDOW):
+    if df.empty:
+        return pd.DataFrame()
+
+    window = pd.Timedelta(seconds=window_seconds)
+    buckets = df['RECORDED_TIME'].dt.floor(window)
+    values = df[ROLLUP_AXES].astype(np.float64)  # float32 讀值以 float64 累加
+    grouped = values.groupby(buckets)
+    counts = grouped.size()
+    starts = counts.index[counts >= STATS_MIN_SAMPLES]
+    if len(starts) == 0:
+        return pd.DataFrame()
+
+    means_sq = (values ** 2).groupby(buckets).mean().loc[starts]
+    stds = grouped.std(ddof=0).loc[starts]
+
+    # 所有視窗的取樣格點串接後仍為遞增序列，一次 np.interp 即可完成重新取樣
+    times = df['RECORDED_TIME'].to_numpy(dtype='datetime64[ns]').astype(np.int64)
+    window_ns = window_seconds * 1_000_000_000
+    offsets = (np.arange(samples) + 0.5) * window_ns / samples
+    grid = (starts.to_numpy(dtype='datetime64[ns]').astype(np.int64)[:, None] + offsets[None, :]).ravel()
+    freqs = np.fft.rfftfreq(samples, window_seconds / samples)
+
+    features = pd.DataFrame({'RECORDED_TIME': starts})
+    for column, suffix in FEATURE_AXES.items():
+        block = np.interp(grid, times, values[column].to_numpy()).reshape(len(starts), samples)
+        spectrum = np.abs(np.fft.rfft(block - block.mean(axis=1, keepdims=True), axis=1))
+        features[f'MSE_{suffix}'] = means_sq[column].to_numpy()
+        features[f'STD_{suffix}'] = stds[column].to_numpy()
+        features[f'PEAK_FREQ_{suffix}'] = freqs[1 + np.argmax(spectrum[:, 1:], axis=1)]
+    return features
+
+# 多設備時每台設備各自切窗計算，結果附上設備欄位
+def compute_device_features(df, window_seconds=STATS_WINDOW_SECONDS, samples=STATS_SAMPLES_PER_WINDOW):
+    if DEVICE_COLUMN not in df.columns:
+        return compute_window_features(df, window_seconds, samples)
+    frames = []
+    for device, rows in df.groupby(DEVICE_COLUMN, sort=False):
+        features = compute_window_features(rows, window_seconds, samples)
+        if not features.empty:
+            frames.append(features.assign(**{DEVICE_COLUMN: device}))
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+# 背景工作執行緒：追蹤 AccelerometerData 的新資料，計算並批次寫入 StatisticsData，同時同步熱儲存、更新彙總表
+# 並將警報與異常偵測事件寫入資料庫。多行程部署時每個工作行程都會啟動，但只有取得檔案鎖的行程 (leader) 執行，
+# leader 結束後鎖自動釋放，由其他行程接手
+class StatisticsWorker:
+    def __init__(self, interval=WORKER_INTERVAL_SECONDS, window_seconds=STATS_WINDOW_SECONDS):
+        self.interval = interval
+        self.window_seconds = window_seconds
+        self.is_leader = False
+        self._stop = threading.Event()
+        self._thread = None
+        self._leader_lock = FileLock(lock_path('statistics-worker'))
+        self._device_engines = {}
+        self._cursors = {}  # 每台設備已處理到的時間 (不含)，沒有任何完整視窗的區段也會推進
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='statistics-worker', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    # 原始資料有設備欄位時，StatisticsData 也需要設備欄位與 (DEVICE_ID, RECORDED_TIME) 索引
+    def _ensure_device_column(self):
+        if has_devices() and DEVICE_COLUMN not in TABLE_COLUMNS['StatisticsData']:
+            add_device_column('StatisticsData')
+            ensure_time_indexes(('StatisticsData',))
+
+    def _run(self):
+        while not self.is_leader:
+            self.is_leader = self._leader_lock.acquire(blocking=False)
+            if not self.is_leader and self._stop.wait(self.interval):
+                return
+        logger.info("Statistics worker elected in process %d", os.getpid())
+
+        while True:
+            try:
+                self._ensure_device_column()
+                self.evaluate_alarms()
+                hot_store.sync()
+                refresh_rollups()
+                while self.run_once() and not self._stop.is_set():
+                    pass  # 落後時連續處理，直到追上最新資料
+            except Exception as e:
+                logger.error(f"Error in statistics worker: {e}")
+            if self._stop.wait(self.interval):
+                self._leader_lock.release()
+                self.is_leader = False
+                return
+
+    # 每台設備的引擎，依資料表分組：原始資料的警報與異常偵測共用一次查詢，統計特徵另有異常偵測
+    def _engines(self, device):
+        engines = self._device_engines.get(device)
+        if engines is None:
+            engines = self._device_engines[device] = {
+                'AccelerometerData': [AlarmEngine(device=device), AnomalyEngine('AccelerometerData', device)],
+                'StatisticsData': [AnomalyEngine('StatisticsData', device)],
+            }
+        return engines
+
+    # 事件只由 leader 寫入，避免每個工作行程各寫一份；儀表板回調的引擎只負責顯示
+    def evaluate_alarms(self):
+        for device in (fetch_devices() if has_devices() else [None]):
+            for table_name, engines in self._engines(device).items():
+                rows = fetch_new_rows(engines, table_name, device)
+                events = [event for engine in engines for event in engine.process(rows)]
+                store_alarm_events(sorted(events, key=lambda event: event['RECORDED_TIME']))
+
+    # 每台設備各處理一批完整視窗，返回是否還有待處理的資料。進度依設備分開計算：
+    # 設備上傳的時間不一致，以全體最新時間為準會跳過落後設備之後補上的資料
+    def run_once(self):
+        pending = [self._run_device(device) for device in (fetch_devices() if has_devices() else [None])]
+        return any(pending)
+
+    def _run_device(self, device):
+        window = pd.Timedelta(seconds=self.window_seconds)
+        latest = fetch_max_time('AccelerometerData', device)
+        if latest is None:
+            return False
+
+        last_stats = fetch_max_time('StatisticsData', device)
+        if last_stats is not None:
+            start = last_stats.floor(window) + window
+        else:
+            start = fetch_min_time('AccelerometerData', device).floor(window)
+        # 資料中斷 (感測器關閉) 的區段不會產生統計列，進度以記憶體中的游標延續，否則會一直重算同一段
+        cursor = self._cursors.get(device)
+        if cursor is not None:
+            start = max(start, cursor)
+
+        # 最後一個視窗可能仍在寫入，只處理已結束的視窗
+        complete_until = latest.floor(window)
+        end = min(complete_until, start + window * STATS_MAX_WINDOWS_PER_BATCH)
+        if start >= end:
+            return False
+
+        rows = query_range('AccelerometerData', None, start, end, upper='<', device=device)
+        if rows is None:
+            return False
+        features = compute_device_features(rows, self.window_seconds)
+        append_rows('StatisticsData', features)
+        logger.info("Computed %d statistics windows for %s from %s to %s", len(features), device, start, end)
+
+        # 下一批從中斷之後的第一筆資料開始，不逐批走過空白的區段
+        following = fetch_rows_after('AccelerometerData', end - pd.Timedelta(microseconds=1), ['RECORDED_TIME'],
+                                     limit=1, device=device)
+        cursor = following['RECORDED_TIME'].iloc[0].floor(window) if not following.empty else end
+        self._cursors[device] = max(cursor, end)
+        return self._cursors[device] < complete_until
+
+statistics_worker = StatisticsWorker()
+
+def start_background_worker():
+    statistics_worker.start()
@@ -0,0 +1,8 @@
+from app import server
+from worker import start_background_worker
+
+# 正式部署的 WSGI 進入點：gunicorn -c gunicorn.conf.py wsgi:application
+# 每個工作行程都啟動背景工作，由檔案鎖選出唯一實際執行的行程
+start_background_worker()
+
+application = server